@@ -0,0 +1,216 @@
+#
+# hakobench.py:
+#   benchmark of the board engines (Bmatrix) for hakoiri.py:
+#     row: list of rows (int per row), mask list made on each test
+#          (Bmatrix before ver. 4.16)
+#     int: one int for the whole board, mask tables (hakocom.py)
+#     gap: int, only the komas next to gaps are tried (hakocom.py)
+#     index: int, the komas next to gaps are looked up by a cell->koma
+#          occupancy list made on each board (not kept in hakocom.py)
+#   boards are taken from the BFS of the puzzle, and all the moves of all
+#   the koma are tested on each board (as hakochild_optsteps()).
+#
+# usage: python hakobench.py [-n N] [-r R] PUZZLENAME
+#
+import argparse
+import time
+
+import hakocom as hi
+from hakocom import Coords, Komaid, Komacls, Colist, Dirid, Mcr, Puzzle, \
+    Options, Bmatrix
+from hakocom import cox, coy
+import readpuzzle as rx
+import hakoiri as hk
+
+
+#------------------------------------------------------------------------
+# row list engine (reference)
+#
+def rowmakemask(shape: list[int], komax: int) -> list[int]:
+    mask = []
+    for mrow in shape:
+        mask.append(mrow << komax)
+    return mask
+
+
+def rowcollidep(co: Coords, ksize: Coords, shape: list[int],
+                bmx: list[int]) -> bool:
+    mask = rowmakemask(shape, cox(co))
+    sum = 0
+    for yo in range(coy(ksize)):
+        sum += bmx[coy(co) + yo] & mask[yo]
+    return sum != 0
+
+
+def rowcreatebmx(puzzle: Puzzle) -> list[int]:
+    fulrow = (1 << cox(puzzle.bsize)) - 1
+    walrow = (1 << (cox(puzzle.bsize) - 1)) | 1
+    bmx = [fulrow] + [walrow for i in range(coy(puzzle.bsize) - 2)] + \
+          [fulrow]
+    for co in puzzle.extwall:
+        bmx[coy(co)] |= 1 << cox(co)
+    return bmx
+
+
+def rowdrawerasebmx(puzzle: Puzzle, kcls: Komacls, co: Coords,
+                    bmx: list[int], mode: int) -> None:
+    mask = rowmakemask(puzzle.clsshape[kcls], cox(co))
+    for yo in range(coy(puzzle.clssiz[kcls])):
+        if mode == 0:
+            bmx[coy(co) + yo] &= ~mask[yo]
+        else:
+            bmx[coy(co) + yo] |= mask[yo]
+    return
+
+
+def rowmakebmatrix(puzzle: Puzzle, colist: Colist) -> list[int]:
+    bmx = rowcreatebmx(puzzle)
+    for kid in range(1, puzzle.nkoma + 1):
+        rowdrawerasebmx(puzzle, puzzle.komacls[kid], colist[kid], bmx, 1)
+    return bmx
+
+
+def benchrow(puzzle: Puzzle, colists: list[Colist]) -> int:
+    nmoves = 0
+    for colist in colists:
+        bmx = rowmakebmatrix(puzzle, colist)
+        for kid in range(1, puzzle.nkoma + 1):
+            kcls = puzzle.komacls[kid]
+            rowdrawerasebmx(puzzle, kcls, colist[kid], bmx, 0)
+            for dn in range(4):
+                if not rowcollidep(Coords(colist[kid] + hi.dirvec[dn]),
+                                   puzzle.clssiz[kcls],
+                                   puzzle.clsshape[kcls], bmx):
+                    nmoves += 1
+            rowdrawerasebmx(puzzle, kcls, colist[kid], bmx, 1)
+    return nmoves
+
+
+#------------------------------------------------------------------------
+# int engine (hakocom.py)
+#
+def benchint(puzzle: Puzzle, colists: list[Colist]) -> int:
+    nmoves = 0
+    for colist in colists:
+        bmx = hi.makebmatrix(puzzle, colist)
+        for kid in range(1, puzzle.nkoma + 1):
+            kcls = puzzle.komacls[kid]
+            kbmx = hi.drawerasebmx(puzzle, kcls, colist[kid], bmx, mode = 0)
+            for dn in range(4):
+                if not hi.movecollidep(puzzle, kcls, Dirid(dn), colist[kid],
+                                       kbmx):
+                    nmoves += 1
+    return nmoves
+
+
+def benchgap(puzzle: Puzzle, colists: list[Colist]) -> int:
+    nmoves = 0
+    for colist in colists:
+        bmx = hi.makebmatrix(puzzle, colist)
+        near = hi.gapnear(puzzle, bmx)
+        for kid in range(1, puzzle.nkoma + 1):
+            kcls = puzzle.komacls[kid]
+            kmask = puzzle.clsmask[kcls][colist[kid]]
+            if kmask & near == 0:
+                continue
+            kbmx = Bmatrix(bmx ^ kmask)
+            for dn in range(4):
+                if not hi.movecollidep(puzzle, kcls, Dirid(dn), colist[kid],
+                                       kbmx):
+                    nmoves += 1
+    return nmoves
+
+
+#------------------------------------------------------------------------
+# cell->koma occupancy index
+#
+def makeoccupancy(puzzle: Puzzle, colist: Colist) -> list[int]:
+    '''
+    KOMAID on each cell (bit # of Bmatrix), 0 if empty or wall
+    '''
+    occ = [0] * 256
+    for kid in range(1, puzzle.nkoma + 1):
+        kmask: int = puzzle.clsmask[puzzle.komacls[kid]][colist[kid]]
+        while kmask != 0:
+            bit = kmask & -kmask
+            occ[bit.bit_length() - 1] = kid
+            kmask ^= bit
+    return occ
+
+
+def benchindex(puzzle: Puzzle, colists: list[Colist]) -> int:
+    nmoves = 0
+    for colist in colists:
+        bmx = hi.makebmatrix(puzzle, colist)
+        occ = makeoccupancy(puzzle, colist)
+        gaps = puzzle.gapmask & ~bmx
+        kids = set()
+        while gaps != 0:
+            bit = gaps & -gaps
+            co = bit.bit_length() - 1
+            for dv in hi.dirvec:
+                if 0 <= co + dv < 256:
+                    kids.add(occ[co + dv])
+            gaps ^= bit
+        kids.discard(0)
+        for kid in kids:
+            kcls = puzzle.komacls[kid]
+            kbmx = Bmatrix(bmx ^ puzzle.clsmask[kcls][colist[kid]])
+            for dn in range(4):
+                if not hi.movecollidep(puzzle, kcls, Dirid(dn), colist[kid],
+                                       kbmx):
+                    nmoves += 1
+    return nmoves
+
+
+#------------------------------------------------------------------------
+def sampleboards(puzzle: Puzzle, nboards: int) -> list[Colist]:
+    '''
+    boards of the BFS from the init, up to nboards
+    '''
+    colists = [Colist(puzzle.initcolist)]
+    memoschash = {hi.hashcolist(puzzle, colists[0])}
+    tosearch = [Mcr(hi.Movehist((hi.Move((Komaid(0), Dirid(0))), )),
+                    colists[0], hi.Rlc(1))]
+    while 0 < len(tosearch) and len(colists) < nboards:
+        foundans, nextsearch = hk.hakochild_optsteps(puzzle, tosearch,
+                                                     memoschash)
+        memoschash |= nextsearch.keys()
+        tosearch = list(nextsearch.values())
+        colists += [mcr.colist for mcr in tosearch]
+    return colists[:nboards]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description = 'benchmark of board engines of hakoiri.py')
+    parser.add_argument('PUZZLENAME')
+    parser.add_argument('-n', '--nboards', metavar = 'N', type = int,
+                        default = 20000,
+                        help = '# boards to test')
+    parser.add_argument('-r', '--repeat', metavar = 'R', type = int,
+                        default = 3,
+                        help = '# repeats (best time is taken)')
+    args = parser.parse_args()
+    opts = Options()
+    opts.filename = args.PUZZLENAME
+    puzzle = rx.readxml(opts)
+    colists = sampleboards(puzzle, args.nboards)
+    ntests = len(colists) * puzzle.nkoma * 4
+    print(f'{puzzle.name}: {len(colists)} boards, {ntests} move tests')
+    for name, bench in (('row', benchrow), ('int', benchint),
+                        ('gap', benchgap), ('index', benchindex)):
+        best = float('inf')
+        for rp in range(args.repeat):
+            t = time.perf_counter()
+            nmoves = bench(puzzle, colists)
+            dt = time.perf_counter() - t
+            if dt < best:
+                best = dt
+        print(f'  {name}: {best:.3f} s, {ntests / best / 1e6:.2f} M tests/s' +
+              f' ({nmoves} moves)')
+    return
+
+
+if __name__ == '__main__':
+    main()
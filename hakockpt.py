@@ -0,0 +1,206 @@
+#
+# hakockpt.py:
+#   checkpoint & resume of the horizontal search for hakoiri.py
+#
+import os
+import struct
+from array import array
+from typing import Optional
+
+import hakocom as hi
+from hakocom import Coords, Komaid, Colist, Schash, Dirid, \
+    Move, Movehist, Rlc, Mcr, Puzzle
+import hakomemo as hm
+
+# index.bin: (STEP, end of memo.bin after the step)
+INDEXREC = struct.Struct('>IQ')
+# cand-NNNN.bin: header (STEP, #candidates, if hist-NNNN.bin is saved),
+#   then records of
+#   RLC, NBASE, HISTBASE, # moves, COLIST (1..nkoma),
+#   MOVES (KOMAID << 2 | DIRID) x # moves
+#   (without hist-NNNN.bin: NBASE 0, HISTBASE -1, MOVES from the init)
+CANDHEAD = struct.Struct('>IQB')
+CANDREC = struct.Struct('>IIqH')
+# hist-NNNN.bin: Histstore of parent-pointer search (-P): header (# states,
+#   # moves), then the arrays parent, segst, segmoves
+HISTHEAD = struct.Struct('>QQ')
+
+
+class Checkpoint:
+    '''
+    files on ckptdir:
+      memo.bin:       packed hashes of the memo, appended on each step
+      index.bin:      where each step ends in memo.bin
+      cand-NNNN.bin:  candidates of step N (only the latest is kept)
+      hist-NNNN.bin:  move histories of the candidates of step N (-P),
+                      the candidates keep only their tails
+    '''
+    def __init__(self, puzzle: Puzzle, ckptdir: str) -> None:
+        self.puzzle = puzzle
+        self.ckptdir = ckptdir
+        self.packer = hm.Schpacker(puzzle)
+        self.nkb = (self.packer.bits + 7) // 8
+        return
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.ckptdir, name)
+
+    def candname(self, step: int) -> str:
+        return f'cand-{step:04d}.bin'
+
+    def histname(self, step: int) -> str:
+        return f'hist-{step:04d}.bin'
+
+#........................................................................
+# write
+#
+    def start(self, schash: Schash) -> None:
+        '''
+        start new checkpoints, memo with schash (of init) on step 0
+        '''
+        os.makedirs(self.ckptdir, exist_ok = True)
+        for name in os.listdir(self.ckptdir):
+            if name.startswith('cand-'):
+                os.remove(self.path(name))
+        open(self.path('memo.bin'), 'wb').close()
+        open(self.path('index.bin'), 'wb').close()
+        self.addstep(0, [schash])
+        return
+
+    def addstep(self, step: int, schashes) -> None:
+        '''
+        append hashes added to the memo on step (candidates of step)
+        '''
+        nkb = self.nkb
+        with open(self.path('memo.bin'), 'ab') as f:
+            f.write(b''.join(self.packer.pack(schash).to_bytes(nkb, 'big')
+                             for schash in schashes))
+            end = f.tell()
+        with open(self.path('index.bin'), 'ab') as f:
+            f.write(INDEXREC.pack(step, end))
+        return
+
+    def save(self, step: int, tosearch: list[Mcr],
+             histstore: Optional[hi.Histstore] = None) -> None:
+        '''
+        save candidates of step (written to tmp, then renamed),
+        remove the older candidates.  with histstore, the Histstore arrays
+        & the tails of the candidates (size not by # candidates x # steps)
+        '''
+        if histstore is not None:
+            tmppath = self.path(self.histname(step) + '.tmp')
+            with open(tmppath, 'wb') as f:
+                f.write(HISTHEAD.pack(len(histstore),
+                                      len(histstore.segmoves)))
+                f.write(histstore.parent.tobytes())
+                f.write(histstore.segst.tobytes())
+                f.write(histstore.segmoves.tobytes())
+            os.replace(tmppath, self.path(self.histname(step)))
+        tmppath = self.path(self.candname(step) + '.tmp')
+        with open(tmppath, 'wb') as f:
+            f.write(CANDHEAD.pack(step, len(tosearch), histstore is not None))
+            for mcr in tosearch:
+                f.write(CANDREC.pack(mcr.rlc, mcr.nbase, mcr.histbase,
+                                     len(mcr.movehist)))
+                f.write(bytes(mcr.colist[1:]))
+                f.write(array('H', [kid << 2 | dirid
+                                    for kid, dirid in mcr.movehist]).tobytes())
+        os.replace(tmppath, self.path(self.candname(step)))
+        for name in os.listdir(self.ckptdir):
+            if name.startswith(('cand-', 'hist-')) and \
+               not name in (self.candname(step), self.histname(step)):
+                os.remove(self.path(name))
+        return
+
+#........................................................................
+# resume
+#
+    def latest(self) -> int:
+        '''
+        step of the latest saved candidates (-1 if none)
+        '''
+        if not os.path.isdir(self.ckptdir):
+            return -1
+        steps = [int(name[5:9]) for name in os.listdir(self.ckptdir)
+                 if name.startswith('cand-') and name.endswith('.bin')]
+        return max(steps, default = -1)
+
+    def load(self, memoschash: hm.Memo, islayered: bool,
+             histstore: Optional[hi.Histstore] = None) \
+            -> tuple[int, list[Mcr], set[Schash]]:
+        '''
+        load the latest checkpoint: truncate memo.bin/index.bin after it,
+        fill memoschash (by pointer, on layered search the last 2 steps)
+        & histstore (by pointer, if saved by -P: without histstore, the
+        move histories are rebuilt from the init).
+        returns (STEP, TOSEARCH, hashes of TOSEARCH)
+        '''
+        step = self.latest()
+        if step < 0:
+            hi.errorstop(f'no checkpoint in {self.ckptdir}')
+        with open(self.path('index.bin'), 'rb') as f:
+            index = [INDEXREC.unpack_from(buf)
+                     for buf in iter(lambda: f.read(INDEXREC.size), b'')]
+        index = [(st, end) for st, end in index if st <= step]
+        if len(index) == 0 or index[-1][0] != step:
+            hi.errorstop(f'memo of step {step} not in {self.ckptdir}')
+        with open(self.path('index.bin'), 'r+b') as f:
+            f.truncate(len(index) * INDEXREC.size)
+        with open(self.path('memo.bin'), 'r+b') as f:
+            f.truncate(index[-1][1])
+        # ends of memo.bin before step - 1, step
+        ends = [0] + [end for st, end in index]
+        st = 0
+        if islayered:
+            st = ends[max(0, len(index) - 2)]
+        lastst = ends[len(index) - 1]
+        lastlayer: set[Schash] = set()
+        nkb = self.nkb
+        with open(self.path('memo.bin'), 'rb') as f:
+            f.seek(st)
+            buf = f.read()
+        for ofs in range(0, len(buf), nkb):
+            schash = self.packer.unpack(
+                int.from_bytes(buf[ofs:ofs + nkb], 'big'))
+            memoschash.add(schash)
+            if lastst <= st + ofs:
+                lastlayer.add(schash)
+        tosearch: list[Mcr] = []
+        nkoma = self.puzzle.nkoma
+        with open(self.path(self.candname(step)), 'rb') as f:
+            cstep, ncand, ishist = CANDHEAD.unpack(f.read(CANDHEAD.size))
+            for cn in range(ncand):
+                rlc, nbase, histbase, nmoves = \
+                    CANDREC.unpack(f.read(CANDREC.size))
+                colist = Colist((Coords(0), ) +
+                                tuple(Coords(co) for co in f.read(nkoma)))
+                moves = array('H')
+                moves.frombytes(f.read(2 * nmoves))
+                tosearch.append(Mcr(Movehist(tuple(
+                                        Move((Komaid(m >> 2), Dirid(m & 3)))
+                                        for m in moves)),
+                                    colist, Rlc(rlc), histbase, nbase))
+        if ishist:
+            saved = self.loadhist(step)
+            if histstore is None:
+                for mcr in tosearch:
+                    mcr.movehist = saved.movehist(mcr)
+                    mcr.histbase = -1
+                    mcr.nbase = 0
+            else:
+                histstore.parent = saved.parent
+                histstore.segst = saved.segst
+                histstore.segmoves = saved.segmoves
+        return step, tosearch, lastlayer
+
+    def loadhist(self, step: int) -> hi.Histstore:
+        histstore = hi.Histstore()
+        with open(self.path(self.histname(step)), 'rb') as f:
+            nstates, nmoves = HISTHEAD.unpack(f.read(HISTHEAD.size))
+            histstore.parent.frombytes(
+                f.read(histstore.parent.itemsize * nstates))
+            histstore.segst.frombytes(
+                f.read(histstore.segst.itemsize * nstates))
+            histstore.segmoves.frombytes(
+                f.read(histstore.segmoves.itemsize * nmoves))
+        return histstore
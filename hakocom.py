@@ -2,6 +2,8 @@ from dataclasses import dataclass, field
 from typing import NewType, Optional, cast, TextIO, NoReturn
 from enum import Enum, auto
 #import numpy as np
+from array import array
+import bisect
 import copy
 import sys
 
@@ -51,14 +53,27 @@ Move = NewType('Move', tuple[Komaid, Dirid])
 # Movehist == tupple version # note: this reducts deepcopy(), super big effect
 Movehist = NewType('Movehist', tuple[Move, ...])
 Rlc = NewType('Rlc', int)
-Bmatrix = NewType('Bmatrix', list[int])
+# board bitmap: bit #co (== (Y << 4) | X) is 1 if wall/koma exists
+#   (16 bits per row, the whole board in one int)
+Bmatrix = NewType('Bmatrix', int)
 Projection = NewType('Projection', tuple[int, int])
+# base of incremental hash (see hashbase()):
+#   (Sclist as bytes, its hash, mirrored Sclist as bytes, its hash)
+Hashbase = NewType('Hashbase', tuple[bytes, int, bytes, int])
 
 @dataclass
 class Mcr:
     movehist: Movehist
     colist: Colist
     rlc: Rlc
+    # on parent-pointer search (Histstore), movehist is only the tail:
+    #   histbase: state # in Histstore the tail follows (-1: full movehist)
+    #   nbase: # moves before the tail (len(movehist) + nbase == full len)
+    histbase: int = -1
+    nbase: int = 0
+    # board of colist, derived from the parent's (Bmatrix(0): not made yet,
+    #   see mcrbmatrix())
+    bmx: Bmatrix = Bmatrix(0)
 
 class Goaltype(Enum):
     BYID = auto()
@@ -85,6 +100,17 @@ class Puzzle:
         = field(default_factory = list[tuple[Komaid, Coords]])
     # all komas (class compatible) reaches their goals
     goal_schash: Schash = Schash(0)
+    # (below are made by compilepuzzle())
+    # index of the 1st koma of the class in Sclist ([ncls] == nkoma)
+    clsofs: list[int] = field(default_factory = list)
+    # Bmatrix of walls (& extwall)
+    basebmx: Bmatrix = Bmatrix(0)
+    # Bmatrix bits of koma class: [KOMACLS][COORDS]
+    clsmask: list[list[Bmatrix]] = field(default_factory = list)
+    # bits newly covered by move: [KOMACLS][DIRID][COORDS]
+    clsmovemask: list[list[list[Bmatrix]]] = field(default_factory = list)
+    # cells in the board (not walls)
+    gapmask: Bmatrix = Bmatrix(0)
 
 @dataclass
 class Options:
@@ -93,8 +119,80 @@ class Options:
     isoptrlc: bool = False
     isparalell: bool = True
     maxnprocs: int = 10
-    minnsearchdiv: int = 200
+    chunksize: int = 200
+    isthreads: bool = False
     ischeckonly: bool = False
+    ishashshard: bool = False
+    isparentptr: bool = False
+    memotype: str = 'set'
+    islayered: bool = False
+    extdir: str = ''
+    ckptinterval: int = 0
+    isresume: bool = False
+    ckptdir: str = ''
+    isnumpy: bool = False
+    isastar: bool = False
+    isidastar: bool = False
+    ttsize: int = 1 << 20
+    pdbdir: str = ''
+    isbidir: bool = False
+    isexactrlc: bool = False
+
+
+class Histstore:
+    '''
+    parent-pointer store of move histories:
+      state #i keeps only its parent state # and the moves from the parent
+      (in compact arrays), instead of Movehist tuples from the init.
+    '''
+    def __init__(self) -> None:
+        self.parent = array('q')     # parent state # (-1: init)
+        self.segst = array('Q')      # start of the moves in segmoves
+        self.segmoves = array('H')   # moves: (KOMAID << 2 | DIRID)
+        return
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def rebase(self, mcr: Mcr) -> None:
+        '''
+        store mcr.movehist (except the 1st, which is the parent's last move)
+        as a new state, cut mcr.movehist to the last move (by pointer)
+        '''
+        sid = len(self.parent)
+        self.parent.append(mcr.histbase)
+        self.segst.append(len(self.segmoves))
+        for kid, dirid in mcr.movehist[1:]:
+            self.segmoves.append(kid << 2 | dirid)
+        mcr.nbase += len(mcr.movehist) - 1
+        mcr.movehist = Movehist(mcr.movehist[-1:])
+        mcr.histbase = sid
+        return
+
+    def movehist(self, mcr: Mcr) -> Movehist:
+        '''
+        full movehist of mcr, by walking the parent pointers
+        '''
+        if mcr.histbase < 0:
+            return mcr.movehist
+        segs = []
+        sid = mcr.histbase
+        while 0 <= sid:
+            if sid + 1 < len(self.segst):
+                ed = self.segst[sid + 1]
+            else:
+                ed = len(self.segmoves)
+            segs.append(self.segmoves[self.segst[sid]:ed])
+            sid = self.parent[sid]
+        moves = [Move((Komaid(0), Dirid(0)))]
+        for seg in reversed(segs):
+            moves += [Move((Komaid(m >> 2), Dirid(m & 3))) for m in seg]
+        return Movehist(tuple(moves) + mcr.movehist[1:])
+
+    def nbytes(self) -> int:
+        return self.parent.itemsize * len(self.parent) + \
+               self.segst.itemsize * len(self.segst) + \
+               self.segmoves.itemsize * len(self.segmoves)
 
 
 # some global constants
@@ -162,65 +260,158 @@ def hashcolist(puzzle: Puzzle, colist: Colist) -> Schash:
 #    print('@hash', hex(r), hex(rr), puzzle.komacls)
     return Schash(min(r, rr))
 
+def hashbase(puzzle: Puzzle, colist: Colist) -> Hashbase:
+    '''
+    class-sorted coords (& mirrored) of colist, as the base of hashmove()
+    '''
+    sclist = []
+    rsclist = []
+    bw = cox(puzzle.bsize)
+    for kid in range(1, puzzle.nkoma + 1):
+        kcls = puzzle.komacls[kid]
+        co = colist[kid]
+        sclist.append((kcls, co))
+        rsclist.append((kcls,
+                        (co & 0xf0) | (bw - cox(co) - cox(puzzle.clssiz[kcls]))))
+    sclist.sort()
+    sb = bytes(co for kcls, co in sclist)
+    if not puzzle.ismirrorident:
+        return Hashbase((sb, int.from_bytes(sb, 'big'), b'', 0))
+    rsclist.sort()
+    rsb = bytes(co for kcls, co in rsclist)
+    return Hashbase((sb, int.from_bytes(sb, 'big'),
+                     rsb, int.from_bytes(rsb, 'big')))
+
+
+def hashmove(puzzle: Puzzle, hb: Hashbase, kid: Komaid,
+             co: Coords, newco: Coords) -> Schash:
+    '''
+    == hashcolist() of the board of hb with koma kid moved from co to newco:
+    only the class segment of the moved koma is re-sorted & re-packed.
+    '''
+    r, rr = hashmovepair(puzzle, hb, kid, co, newco)
+    return Schash(min(r, rr))
+
+
+def hashmovepair(puzzle: Puzzle, hb: Hashbase, kid: Komaid,
+                 co: Coords, newco: Coords) -> tuple[int, int]:
+    '''
+    hashmove() before min(): (hash, hash of the mirror), the mirror is the
+    same as the hash if not ismirrorident
+    '''
+    def shiftin(sb: bytes, r: int, st: int, ed: int,
+                co: int, newco: int) -> int:
+        sh = (puzzle.nkoma - ed) << 3
+        if ed - st == 1:  # unique in the class
+            return r + ((newco - co) << sh)
+        seg = list(sb[st:ed])
+        seg[bisect.bisect_left(seg, co)] = newco
+        seg.sort()
+        return r + ((int.from_bytes(bytes(seg), 'big') -
+                     int.from_bytes(sb[st:ed], 'big')) << sh)
+
+    kcls = puzzle.komacls[kid]
+    st = puzzle.clsofs[kcls]
+    ed = puzzle.clsofs[kcls + 1]
+    r = shiftin(hb[0], hb[1], st, ed, co, newco)
+    if not puzzle.ismirrorident:
+        return r, r
+    mx = cox(puzzle.bsize) - cox(puzzle.clssiz[kcls])
+    rr = shiftin(hb[2], hb[3], st, ed,
+                 (co & 0xf0) | (mx - cox(co)), (newco & 0xf0) | (mx - cox(newco)))
+    return r, rr
+
 #------------------------------------------------------------------------
-# board matrix functions
+# compiled (derived) puzzle definitions
 #
-def makemask(shape: list[int], komax: int):
-    mask = []
-    for mrow in shape:
-        mask.append(mrow << komax)
-    return mask
-
+def compilepuzzle(puzzle: Puzzle) -> None:
+    '''
+    make derived tables on puzzle (by pointer), after komacls is fixed
+    '''
+    ncls = len(puzzle.clssiz)
+    clscnt = [0] * (ncls + 1)
+    for kid in range(1, puzzle.nkoma + 1):
+        clscnt[puzzle.komacls[kid] + 1] += 1
+    puzzle.clsofs = [0] * (ncls + 1)
+    for kcls in range(1, ncls + 1):
+        puzzle.clsofs[kcls] = puzzle.clsofs[kcls - 1] + clscnt[kcls]
+# mask tables: every coords the koma of the class fits in the board
+#   (walls included), & for every move from there
+    puzzle.basebmx = createbmx(puzzle)
+    by, bx = co2yx(puzzle.bsize)
+    puzzle.gapmask = Bmatrix(~puzzle.basebmx & ((1 << (by << 4)) - 1))
+    puzzle.clsmask = [[]]
+    puzzle.clsmovemask = [[]]
+    for kcls in range(1, ncls):
+        ky, kx = co2yx(puzzle.clssiz[kcls])
+        mask0 = 0  # at coords 0
+        for yo, row in enumerate(puzzle.clsshape[kcls]):
+            mask0 |= row << (yo << 4)
+        masks = [Bmatrix(0)] * 256
+        for y in range(by - ky + 1):
+            for x in range(bx - kx + 1):
+                masks[(y << 4) | x] = Bmatrix(mask0 << ((y << 4) | x))
+        movemasks = []
+        for dn in range(4):
+            mmasks = [Bmatrix(0)] * 256
+            for y in range(1, by - ky):
+                for x in range(1, bx - kx):
+                    co = (y << 4) | x
+                    mmasks[co] = Bmatrix(masks[co + dirvec[dn]] & ~masks[co])
+            movemasks.append(mmasks)
+        puzzle.clsmask.append(masks)
+        puzzle.clsmovemask.append(movemasks)
+    return
 
-def collidep(co: Coords, ksize: Coords, shape: list[int], bmx: Bmatrix) \
+#------------------------------------------------------------------------
+# board matrix functions
+#
+def collidep(puzzle: Puzzle, kcls: Komacls, co: Coords, bmx: Bmatrix) \
     -> bool:
     if co == Coords(0):
         return False
-    ce = co + ksize
-    mask = makemask(shape, cox(co))
-    sum = 0
-    for yo in range(coy(ksize)):
-        sum += bmx[coy(co) + yo] & mask[yo]
-    if sum != 0:
-        return True
-    return False
+    return bmx & puzzle.clsmask[kcls][co] != 0
+
+
+def movecollidep(puzzle: Puzzle, kcls: Komacls, dirid: Dirid, co: Coords,
+                 bmx: Bmatrix) -> bool:
+    '''
+    koma of kcls at co cannot move to dirid:
+    only the newly covered bits are tested (koma itself may be drawn on bmx)
+    '''
+    return bmx & puzzle.clsmovemask[kcls][dirid][co] != 0
 
 
 def createbmx(puzzle: Puzzle) -> Bmatrix:
     fulrow = (1 << cox(puzzle.bsize)) - 1
     walrow = (1 << (cox(puzzle.bsize) - 1)) | 1
-    bmx = Bmatrix([fulrow] + \
-                  [walrow for i in range(coy(puzzle.bsize) - 2)] + \
-                  [fulrow])
+    bmx = fulrow | (fulrow << ((coy(puzzle.bsize) - 1) << 4))
+    for y in range(1, coy(puzzle.bsize) - 1):
+        bmx |= walrow << (y << 4)
     for co in puzzle.extwall:
-        bmx[coy(co)] |= 1 << cox(co)
-    # row (0, last) are the same object but not rewritten
-#    for r in bmx:
-#        print(bin(r)[-1:1:-1])
-    return bmx
+        bmx |= 1 << co
+#    for y in range(coy(puzzle.bsize)):
+#        print(bin(bmxrow(bmx, y))[-1:1:-1])
+    return Bmatrix(bmx)
+
+
+def bmxrow(bmx: Bmatrix, y: int) -> int:
+    return (bmx >> (y << 4)) & 0xffff
 
 
 def drawerasebmx(puzzle: Puzzle, kcls: Komacls, co: Coords,
-                 bmx: Bmatrix, mode: int = 2) -> None:
+                 bmx: Bmatrix, mode: int = 2) -> Bmatrix:
     '''
     mode: 0: erase, 1: draw, 2: reverse
+    returns new bmx (int, not by pointer)
     '''
-#    print(f'(draw){kcls = }, co = {hex(co)}')
-#    for r in bmx:
-#        print(bin(r)[-1:1:-1])
-    mask = makemask(puzzle.clsshape[kcls], cox(co))
-    for yo in range(coy(puzzle.clssiz[kcls])):
-        match mode:
-            case 0:
-                bmx[coy(co) + yo] &= ~mask[yo]
-            case 1:
-                bmx[coy(co) + yo] |= mask[yo]
-            case 2:
-                bmx[coy(co) + yo] ^= mask[yo]
-#    for r in bmx:
-#        print(bin(r)[-1:1:-1])
-
-    return
+    match mode:
+        case 0:
+            return Bmatrix(bmx & ~puzzle.clsmask[kcls][co])
+        case 1:
+            return Bmatrix(bmx | puzzle.clsmask[kcls][co])
+        case _:
+            return Bmatrix(bmx ^ puzzle.clsmask[kcls][co])
 
 
 def makebmatrix(puzzle: Puzzle, col: Colist | list[Coords],
@@ -230,13 +421,83 @@ def makebmatrix(puzzle: Puzzle, col: Colist | list[Coords],
     makeup bmatrix: for collision detection & drawing
     xkoma is name of excluded koma (set False when draw all koma)
     '''
-    bmx = createbmx(puzzle)
+    bmx: int = puzzle.basebmx
     for kid in range(1, puzzle.nkoma + 1):
         if col[kid] != 0 and kid != xkoma:  # maybe 0 if goal
-            drawerasebmx(puzzle, puzzle.komacls[kid], col[kid], bmx,
-                         mode = 1)
+            bmx |= puzzle.clsmask[puzzle.komacls[kid]][col[kid]]
+
+    return Bmatrix(bmx)
+
+def gapnear(puzzle: Puzzle, bmx: Bmatrix) -> Bmatrix:
+    '''
+    cells next to an empty cell (gap) in the board:
+    only the komas on them can move (gap driven move generation)
+    '''
+    gaps = puzzle.gapmask & ~bmx
+    return Bmatrix((gaps << 16) | (gaps >> 1) | (gaps >> 16) | (gaps << 1))
+
+
+def mcrbmatrix(puzzle: Puzzle, mcr: Mcr, xkoma: Komaid = Komaid(-1)) \
+        -> Bmatrix:
+    '''
+    board of mcr (xkoma erased): from the board carried by mcr,
+    made up only if not carried (init, loaded from file, ...)
+    '''
+    if mcr.bmx == 0:
+        mcr.bmx = makebmatrix(puzzle, mcr.colist)
+    if xkoma < 0:
+        return mcr.bmx
+    return Bmatrix(mcr.bmx ^
+                   puzzle.clsmask[puzzle.komacls[xkoma]][mcr.colist[xkoma]])
+
+def komareach(puzzle: Puzzle, kcls: Komacls, co: Coords, bmx: Bmatrix) \
+        -> tuple[list[Coords], bytearray]:
+    '''
+    flood fill of the koma of kcls from co on bmx (the koma erased):
+    returns the coords reached (nearest first, co not included) and
+    the DIRID moved into each coords (indexed by coords, see reachpath())
+    '''
+    reach = 1 << co  # bitmap of coords reached
+    pdir = bytearray(256)
+    cos = [co]
+    i = 0
+    while i < len(cos):
+        fco = cos[i]
+        i += 1
+        for dn in range(4):
+            newco = fco + dirvec[dn]
+            if (reach >> newco) & 1 or \
+               movecollidep(puzzle, kcls, Dirid(dn), Coords(fco), bmx):
+                continue
+            reach |= 1 << newco
+            pdir[newco] = dn
+            cos.append(Coords(newco))
+    return cos[1:], pdir
+
+
+def reachpath(co: Coords, goalco: Coords, pdir: bytearray) -> list[Dirid]:
+    '''
+    shortest DIRIDs from co to goalco by pdir of komareach()
+    '''
+    dirs = []
+    while goalco != co:
+        dirs.append(Dirid(pdir[goalco]))
+        goalco = Coords(goalco - dirvec[pdir[goalco]])
+    return dirs[::-1]
+
 
-    return bmx
+def komapath(puzzle: Puzzle, colist: Colist, kid: Komaid, goalco: Coords) \
+        -> list[Move]:
+    '''
+    shortest moves of koma kid from colist[kid] to goalco
+    (other komas don't move), [] if cannot reach
+    '''
+    bmx = makebmatrix(puzzle, colist, xkoma = kid)
+    reached, pdir = komareach(puzzle, puzzle.komacls[kid], colist[kid], bmx)
+    if not goalco in reached:
+        return []
+    return [Move((kid, dirid))
+            for dirid in reachpath(colist[kid], goalco, pdir)]
 
 #------------------------------------------------------------------------
 # goal functions
@@ -308,24 +569,46 @@ def printnamematrix(puzzle: Puzzle, colist: Colist,
     return
 
 
+def ansmetric(isoptrlc: bool, mcr: Mcr) -> int:
+    '''
+    tie-break of the answers of the same step/RLC (smaller is better):
+    # steps on optrlc search, RLC on optstep search
+    '''
+    if isoptrlc:
+        return mcr.nbase + len(mcr.movehist)
+    return mcr.rlc
+
+def canimprove(isoptrlc: bool, mcr: Mcr, best: int) -> bool:
+    '''
+    if an answer found from mcr (by one step/RLC) can be better than best
+    (a child has 1 step more, RLC same or 1 more)
+    '''
+    if isoptrlc:
+        return mcr.nbase + len(mcr.movehist) + 1 < best
+    return mcr.rlc < best
+
 def printbestans(puzzle: Puzzle, foundans: list[Mcr],
-                 initcolist: Colist, isoptrlc: bool) -> None:
+                 initcolist: Colist, isoptrlc: bool,
+                 histstore: Optional[Histstore] = None) -> None:
     bestrs = None
     for mcr in foundans:
-        if isoptrlc:
-            if bestrs is None or len(mcr.movehist) < bestrs:
-                bestrs = len(mcr.movehist)
-                bestmovehist = mcr.movehist
-        else:
-            if bestrs is None or mcr.rlc < bestrs:
-                bestrs = mcr.rlc
-                bestmovehist = mcr.movehist
-    printhist(puzzle, bestmovehist)
+        if bestrs is None or ansmetric(isoptrlc, mcr) < bestrs:
+            bestrs = ansmetric(isoptrlc, mcr)
+            bestmcr = mcr
+    printhist(puzzle, bestmcr.movehist, histstore, bestmcr.histbase)
     sys.exit(0)
 #NEVERREACHED
 
 
-def printhist(puzzle: Puzzle, moves: Movehist) -> None:
+def printhist(puzzle: Puzzle, moves: Movehist,
+              histstore: Optional[Histstore] = None, histbase: int = -1) \
+        -> None:
+    '''
+    moves: full movehist, or the tail after histbase in histstore
+    '''
+    if histstore is not None:
+        moves = histstore.movehist(Mcr(moves, Colist(()), Rlc(0),
+                                       histbase = histbase))
     bmatrix = makebmatrix(puzzle, Colist(puzzle.initcolist))
     print('initial:')
     printnamematrix(puzzle, Colist(puzzle.initcolist))
@@ -409,16 +692,47 @@ def printoptions(opts: Options):
     print('options:')
     print(f'    XML file: {opts.filename}')
     print('    mode: optimal ', end = '')
-    if opts.isoptrlc:
+    if opts.isexactrlc:
+        print('RLC search (exact, 0-1 BFS)')
+    elif opts.isoptrlc:
         print('RLC search')
+    elif opts.isastar:
+        print('# step search (best first, A*)')
+    elif opts.isbidir:
+        print('# step search (bidirectional)')
+    elif opts.isidastar:
+        print('# step search (IDA*, transposition table: ' +
+              f'{opts.ttsize} entries)')
     else:
         print('# step search')
     print('    paralell search: ', end = '')
-    if opts.isparalell:
+    if opts.ishashshard:
+        print(f'True (hash sharded, #procs: {opts.maxnprocs})')
+    elif opts.isparalell and opts.isthreads:
+        print(f'True (threads, max #threads: {opts.maxnprocs}, ' + \
+              f'chunk: {opts.chunksize} cand.)')
+    elif opts.isparalell:
         print(f'True (max #procs: {opts.maxnprocs}, ' + \
-              f'min #cand: {opts.minnsearchdiv})')
+              f'chunk: {opts.chunksize} cand.)')
     else:
         print('False')
+    if opts.extdir != '':
+        print(f'    memo & candidates: on disk ({opts.extdir})', end = '')
+    else:
+        print(f'    memo: {opts.memotype}', end = '')
+    if opts.islayered:
+        print(' (layered: last 2 steps only)')
+    else:
+        print()
+    if opts.isparentptr:
+        print('    move history: parent pointer')
+    if opts.isnumpy:
+        print('    successor generation: numpy batched')
+    if 0 < opts.ckptinterval:
+        print(f'    checkpoint: every {opts.ckptinterval} steps ' +
+              f'to {opts.ckptdir}')
+    if opts.isresume:
+        print(f'    resume from: {opts.ckptdir}')
     if opts.ischeckonly:
         print('    * check only (stop)')
     elif 0 <= opts.stopsteps:
@@ -0,0 +1,207 @@
+#
+# hakodisk.py:
+#   external memory (disk) horizontal search for hakoiri.py
+#   candidates of each step/RLC are kept in a file of packed records
+#   sorted by the packed hash, searched boards are found by sorted merge
+#   (delayed duplicate detection), not by memo on memory.
+#
+import heapq
+import mmap
+import os
+import struct
+from typing import Iterator, Optional
+
+import hakocom as hi
+from hakocom import Coords, Komaid, Colist, Schash, Dirid, \
+    Move, Movehist, Rlc, Mcr, Puzzle
+import hakomemo as hm
+
+# records in a search chunk (on memory)
+CHUNKRECS = 1 << 16
+# records read at once on merge
+READRECS = 1 << 12
+
+
+class Extbfs:
+    '''
+    files on workdir:
+      level-NNNN.bin: candidates of step/RLC N, sorted by KEY, records:
+        KEY (packed hash, big endian), PRIO, RLC, NSTEPS,
+        KOMAID & DIRID of the last move, PARENT (record # on step N - 1),
+        COLIST (1..nkoma)
+      run-NNNN.bin:   a sorted chunk of the next candidates (temporary)
+      visited.bin:    KEYs of all the searched boards, sorted
+    PRIO: smaller is better on the same KEY (merge keeps the 1st).
+    '''
+    def __init__(self, puzzle: Puzzle, workdir: str, islayered: bool) \
+            -> None:
+        self.puzzle = puzzle
+        self.workdir = workdir
+        self.islayered = islayered
+        self.packer = hm.Schpacker(puzzle)
+        self.nkb = (self.packer.bits + 7) // 8
+        self.rec = struct.Struct(f'>{self.nkb}sIIIBBQ{puzzle.nkoma}s')
+        self.nsort = self.nkb + 4  # KEY + PRIO
+        self.nruns = 0
+        os.makedirs(workdir, exist_ok = True)
+        return
+
+    def levelpath(self, step: int) -> str:
+        return os.path.join(self.workdir, f'level-{step:04d}.bin')
+
+    def runpath(self, rn: int) -> str:
+        return os.path.join(self.workdir, f'run-{rn:04d}.bin')
+
+    def visitedpath(self) -> str:
+        return os.path.join(self.workdir, 'visited.bin')
+
+#........................................................................
+# records
+#
+    def packrec(self, schash: Schash, prio: int, mcr: Mcr) -> bytes:
+        kid, dirid = mcr.movehist[-1]
+        return self.rec.pack(
+            self.packer.pack(schash).to_bytes(self.nkb, 'big'), prio,
+            mcr.rlc, mcr.nbase + len(mcr.movehist) - 1, kid, dirid,
+            mcr.histbase, bytes(mcr.colist[1:]))
+
+    def unpackrec(self, buf: bytes | mmap.mmap, rn: int) -> Mcr:
+        '''
+        record #rn as Mcr: movehist is the last move only,
+                           histbase is the record # (parent of successors)
+        '''
+        key, prio, rlc, nsteps, kid, dirid, parent, cob = \
+            self.rec.unpack_from(buf, rn * self.rec.size)
+        return Mcr(Movehist((Move((Komaid(kid), Dirid(dirid))), )),
+                   Colist((Coords(0), ) + tuple(Coords(co) for co in cob)),
+                   Rlc(rlc), rn, nsteps)
+
+    def init(self, mcr: Mcr) -> None:
+        schash = hi.hashcolist(self.puzzle, mcr.colist)
+        mcr.histbase = 0
+        with open(self.levelpath(0), 'wb') as f:
+            f.write(self.packrec(schash, 0, mcr))
+        if not self.islayered:
+            with open(self.visitedpath(), 'wb') as f:
+                f.write(self.packer.pack(schash).to_bytes(self.nkb, 'big'))
+        return
+
+    def nrecs(self, step: int) -> int:
+        return os.path.getsize(self.levelpath(step)) // self.rec.size
+
+    def frontier(self, step: int) -> Iterator[list[Mcr]]:
+        '''
+        candidates of step, in chunks of CHUNKRECS (mapped from file)
+        '''
+        nrecs = self.nrecs(step)
+        if nrecs == 0:
+            return
+        with open(self.levelpath(step), 'rb') as f, \
+             mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+            for st in range(0, nrecs, CHUNKRECS):
+                yield [self.unpackrec(mm, rn)
+                       for rn in range(st, min(st + CHUNKRECS, nrecs))]
+        return
+
+#........................................................................
+# sort & merge
+#
+    def addrun(self, recs: list[bytes]) -> None:
+        '''
+        sort records of a chunk and write as a run
+        '''
+        recs.sort()
+        with open(self.runpath(self.nruns), 'wb') as f:
+            f.write(b''.join(recs))
+        self.nruns += 1
+        return
+
+    def readrecs(self, path: str, size: int) -> Iterator[bytes]:
+        with open(path, 'rb') as f:
+            while 0 < len(buf := f.read(size * READRECS)):
+                for ofs in range(0, len(buf), size):
+                    yield buf[ofs:ofs + size]
+        return
+
+    def closelevel(self, step: int) -> int:
+        '''
+        merge runs to level step + 1: keep the 1st (best PRIO) of the same
+        KEY, drop searched KEYs (in visited, or on layered search, in the
+        level step - 1 & step). returns # candidates of step + 1.
+        '''
+        nkb = self.nkb
+        runs = [self.readrecs(self.runpath(rn), self.rec.size)
+                for rn in range(self.nruns)]
+        seen: Iterator[bytes]
+        if self.islayered:
+            olds = [self.readrecs(self.levelpath(st), self.rec.size)
+                    for st in (step - 1, step) if 0 <= st]
+            seen = heapq.merge(*[(r[:nkb] for r in old) for old in olds])
+        else:
+            seen = self.readrecs(self.visitedpath(), nkb)
+        newvisited = self.visitedpath() + '.new'
+        nnew = 0
+        with open(self.levelpath(step + 1), 'wb') as fl, \
+             open(newvisited if not self.islayered else os.devnull,
+                  'wb') as fv:
+            lastkey = b''
+            seenkey: Optional[bytes] = next(seen, None)
+            for r in heapq.merge(*runs, key = lambda r: r[:self.nsort]):
+                key = r[:nkb]
+                if key == lastkey:  # worse PRIO of the same KEY
+                    continue
+                lastkey = key
+                while seenkey is not None and seenkey < key:
+                    fv.write(seenkey)
+                    seenkey = next(seen, None)
+                if seenkey == key:
+                    continue
+                fl.write(r)
+                fv.write(key)
+                nnew += 1
+            while seenkey is not None:
+                fv.write(seenkey)
+                seenkey = next(seen, None)
+        for rn in range(self.nruns):
+            os.remove(self.runpath(rn))
+        self.nruns = 0
+        if not self.islayered:
+            os.replace(newvisited, self.visitedpath())
+        # (level files are kept for the move history)
+        return nnew
+
+#........................................................................
+# move history
+#
+    def readrec(self, step: int, rn: int) -> tuple[Mcr, int]:
+        '''
+        record #rn of step as (Mcr, PARENT)
+        '''
+        with open(self.levelpath(step), 'rb') as f:
+            f.seek(rn * self.rec.size)
+            buf = f.read(self.rec.size)
+        mcr = self.unpackrec(buf, 0)
+        mcr.histbase = rn
+        return mcr, self.rec.unpack_from(buf)[6]
+
+    def movehist(self, step: int, mcr: Mcr) -> Movehist:
+        '''
+        full movehist of mcr (successor of record #histbase on step):
+        walk the PARENTs back to step 0.
+        moves of a koma between parent & child are made by komapath().
+        '''
+        moves: list[Move] = list(mcr.movehist[1:])
+        rec, parent = self.readrec(step, mcr.histbase)
+        for st in range(step, 0, -1):
+            prec, pparent = self.readrec(st - 1, parent)
+            kid = rec.movehist[-1][0]
+            moves = hi.komapath(self.puzzle, prec.colist, kid,
+                                rec.colist[kid]) + moves
+            rec, parent = prec, pparent
+        return Movehist((Move((Komaid(0), Dirid(0))), ) + tuple(moves))
+
+    def cleanup(self) -> None:
+        for name in os.listdir(self.workdir):
+            if name.startswith(('level-', 'run-', 'visited.bin')):
+                os.remove(os.path.join(self.workdir, name))
+        return
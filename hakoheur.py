@@ -0,0 +1,143 @@
+#
+# hakoheur.py:
+#   lower bounds of # steps to the goal (admissible heuristics) for the
+#   best first (A*) search of hakoiri.py
+#   h = (manhattan distance of the goal komas to their goals: on a class
+#        of some goals, the least sum of a matching of komas to goals)
+#     + (# other komas on the goal cells: each must move at least once)
+#   one step moves one koma by one cell, that changes only one of the
+#   terms by at most 1 (consistent).
+#   with pattern databases (hakopdb.py), the larger of the above & the sum
+#   of the tables.
+#
+import heapq
+from typing import Optional, Callable
+
+import hakocom as hi
+from hakocom import Coords, Komaid, Colist, Schash, Mcr, Puzzle
+from hakocom import cox, coy
+
+
+class Heuristic:
+    '''
+    h(colist): lower bound of # steps from colist to the goal
+    (on mirror identical puzzles, the smaller of colist & its mirror)
+    pdbset: h of the pattern databases (hakopdb.Pdbset), if any
+    '''
+    def __init__(self, puzzle: Puzzle,
+                 pdbset: Optional[Callable[[Colist], int]] = None) -> None:
+        self.puzzle = puzzle
+        self.pdbset = pdbset
+        self.bwidth = cox(puzzle.bsize)
+        # goals: (komas that can be there, [(goal Y, goal X), ...])
+        #   BYID: the koma & its goal, BYCLS/BYCLSHASH: the komas of the
+        #   class & all the goals of the class (each koma to one goal)
+        self.goals: list[tuple[list[Komaid], list[tuple[int, int]]]] = []
+        clsgoals: dict[int, list[tuple[int, int]]] = dict()
+        for kid, gco in puzzle.goal_koma:
+            if puzzle.goaltype == hi.Goaltype.BYID:
+                self.goals.append(([kid], [(coy(gco), cox(gco))]))
+            else:
+                clsgoals.setdefault(puzzle.komacls[kid], []).append(
+                    (coy(gco), cox(gco)))
+        for kcls, gyxs in clsgoals.items():
+            self.goals.append(([Komaid(k) for k in range(1, puzzle.nkoma + 1)
+                                if puzzle.komacls[k] == kcls], gyxs))
+        # komas that may block the goal cells (not of the goal classes)
+        goalcls = {puzzle.komacls[kid] for kid, gco in puzzle.goal_koma}
+        self.blockers = [Komaid(k) for k in range(1, puzzle.nkoma + 1)
+                         if not puzzle.komacls[k] in goalcls]
+        self.goalmask = 0
+        for kid, gco in puzzle.goal_koma:
+            self.goalmask |= puzzle.clsmask[puzzle.komacls[kid]][gco]
+        return
+
+    def mirror(self, kid: Komaid, co: Coords) -> Coords:
+        kw = cox(self.puzzle.clssiz[self.puzzle.komacls[kid]])
+        return Coords((co & 0xf0) | (self.bwidth - cox(co) - kw))
+
+    def h1(self, colist: Colist, ismirror: bool) -> int:
+        puzzle = self.puzzle
+        if ismirror:
+            colist = Colist((Coords(0), ) +
+                            tuple(self.mirror(Komaid(k), colist[k])
+                                  for k in range(1, puzzle.nkoma + 1)))
+        h = 0
+        for kids, gyxs in self.goals:
+            h += matchdist(colist, kids, gyxs)
+        for k in self.blockers:
+            if puzzle.clsmask[puzzle.komacls[k]][colist[k]] & self.goalmask:
+                h += 1
+        if self.pdbset is not None:
+            h = max(h, self.pdbset(colist))
+        return h
+
+    def __call__(self, colist: Colist) -> int:
+        h = self.h1(colist, False)
+        if self.puzzle.ismirrorident and 0 < h:
+            h = min(h, self.h1(colist, True))
+        return h
+
+
+def matchdist(colist: Colist, kids: list[Komaid],
+              gyxs: list[tuple[int, int]]) -> int:
+    '''
+    least sum of the manhattan distances of a matching of the komas kids
+    to the goals gyxs (each koma to one goal at most, len(gyxs) <= len(kids)):
+    DP on the set of the goals taken, koma by koma
+    '''
+    if len(gyxs) == 1:
+        gy, gx = gyxs[0]
+        return min(abs(coy(colist[k]) - gy) + abs(cox(colist[k]) - gx)
+                   for k in kids)
+    taken = {0: 0}  # set of goals taken (bits) -> least sum
+    for k in kids:
+        ky, kx = coy(colist[k]), cox(colist[k])
+        for gset, d in list(taken.items()):
+            for gi, (gy, gx) in enumerate(gyxs):
+                if gset >> gi & 1:
+                    continue
+                ngset = gset | (1 << gi)
+                nd = d + abs(ky - gy) + abs(kx - gx)
+                if not ngset in taken or nd < taken[ngset]:
+                    taken[ngset] = nd
+    return taken[(1 << len(gyxs)) - 1]
+
+
+class Openlist:
+    '''
+    priority queue of Mcr by (F, G, PRIO): shallower first on the same F
+    (G: # steps, F = G + h, PRIO: RLC tie-break as mergenextsearch() of
+    hakoiri.py), with the best (G, PRIO) of each hash.
+    with consistent h, all the parents of a board on the same F are taken
+    out before it, so the board is taken out with the best RLC as BFS
+    '''
+    def __init__(self) -> None:
+        self.heap: list[tuple[int, int, int, int, Schash, Mcr]] = []
+        self.best: dict[Schash, tuple[int, int]] = dict()
+        self.count = 0
+        return
+
+    def __len__(self) -> int:
+        return len(self.best)
+
+    def push(self, schash: Schash, mcr: Mcr, g: int, h: int,
+             prio: int) -> None:
+        if schash in self.best and self.best[schash] <= (g, prio):
+            return
+        self.best[schash] = (g, prio)
+        self.count += 1
+        heapq.heappush(self.heap, (g + h, g, prio, self.count, schash, mcr))
+        return
+
+    def pop(self) -> Optional[tuple[int, Schash, Mcr]]:
+        '''
+        (F, SCHASH, MCR) of the best, skipping the outdated entries
+        '''
+        while 0 < len(self.heap):
+            f, g, prio, cnt, schash, mcr = heapq.heappop(self.heap)
+            if self.best.get(schash) != (g, prio):
+                continue
+            del(self.best[schash])
+            return f, schash, mcr
+        return None
@@ -54,7 +54,49 @@
 # 2025. 8. 1: ver. 4.5: options to be struct
 # 2025. 8. 4: ver. 4.6: pre-collision-judgement (projection to x-/y-axis) 
 #                       introduced (on opt-RLC search only)
-version = '4.6'
+# 2026.10.18: ver. 4.7: persistent worker pool (hakopool.py) reused on all
+#                       steps, children keep own memo and get new hashes only
+# 2026.10.18: ver. 4.8: hash sharded memo/candidates owned by workers (-H)
+# 2026.10.18: ver. 4.9: parent-pointer move history store (-P)
+# 2026.10.18: ver. 4.10: incremental hash from the parent's class-sorted
+#                        coords, re-sort only the class of moved koma
+# 2026.10.18: ver. 4.11: array backed memo with packed hash (-m array)
+# 2026.10.18: ver. 4.12: layered search, memo of the last 2 steps only (-l)
+# 2026.10.18: ver. 4.13: external memory search (hakodisk.py, -e DIR):
+#                        candidates & memo on sorted files, merged by step
+# 2026.10.18: ver. 4.14: checkpoint (memo appended by step) & resume (-k/-u)
+# 2026.10.18: ver. 4.15: numpy batched successor generation (hakovec.py, -y)
+# 2026.10.18: ver. 4.16: per-class mask tables (compilepuzzle()): move test
+#                        by newly covered bits only, no mask made on search
+# 2026.10.18: ver. 4.17: Bmatrix be one int (16 bits per row): draw/erase/
+#                        collision by one mask op (hakobench.py to compare)
+# 2026.10.18: ver. 4.18: Mcr carries its board, derived from the parent's
+#                        by 1 koma move (not made up for every candidate)
+# 2026.10.18: ver. 4.19: gap driven move generation: only the komas next to
+#                        gaps are tried
+# 2026.10.18: ver. 4.20: best first (A*) search with lower bound of steps
+#                        (hakoheur.py, -a), # expanded nodes displayed
+# 2026.10.18: ver. 4.21: IDA* with fixed size transposition table (-i/-T)
+# 2026.10.18: ver. 4.22: pattern databases (hakopdb.py) for A*/IDA* (-b)
+# 2026.10.18: ver. 4.23: bidirectional search for byclshash goal (-B)
+# 2026.10.18: ver. 4.24: exact optimal RLC search by 0-1 BFS on (board,
+#                        last moved koma) (-z)
+# 2026.10.18: ver. 4.25: RL move by flood fill of the koma (komareach()),
+#                        instead of recursive DFS (contigmove())
+# 2026.10.18: ver. 4.26: paralell search by chunks from a queue, handed to
+#                        the worker which is done (-d be the chunk size),
+#                        idle time of the workers displayed
+# 2026.10.18: ver. 4.27: memo on shared memory probed by the workers
+#                        directly, not copied to each (-m shm)
+# 2026.10.18: ver. 4.28: chunks/results handed to/from the workers as packed
+#                        records (hakopool.Mcrcodec), not pickled Mcr
+# 2026.10.18: ver. 4.29: results merged by the workers, partitioned by hash,
+#                        expand/merge time displayed
+# 2026.10.18: ver. 4.30: on a goal, workers search only the candidates that
+#                        can give a better answer, & no merge
+# 2026.10.18: ver. 4.31: thread backend of the paralell search (-w),
+#                        benchmark of the backends (hakoparbench.py)
+version = '4.31'
 #
 # articles:
 #   (Part I):  https://zenn.dev/taroh/articles/2703c914dd6597
@@ -63,11 +105,11 @@ version = '4.6'
 
 #import numpy as np
 import copy
+import os
 import sys
 import time
-import concurrent.futures
-import multiprocessing
-#from collections import deque
+from array import array
+from collections import deque
 #from collections import ChainMap
 from typing import NewType, Optional
 import argparse
@@ -80,6 +122,13 @@ from hakocom import Coords, \
     Puzzle, Options
 from hakocom import cox, coy, co2yx, yx2co
 import readpuzzle as rx
+import hakopool as hp
+import hakomemo as hm
+import hakodisk as hd
+import hakockpt as hc
+import hakovec as hv
+import hakoheur as hh
+import hakopdb as hb
 
 
 #........................................................................
@@ -128,9 +177,42 @@ def getoptions() -> Options:
     parser.add_argument('-x', '--maxnprocs', metavar = 'N', type = int,
                         default = 10,
                         help = 'maximum # child processes')
-    parser.add_argument('-d', '--minnsearchdiv', metavar = 'N', type = int,
-                        default = 200,
-                        help = 'minimum # candidates in a division (child)')
+    parser.add_argument('-d', '--chunksize', '--minnsearchdiv',
+                        metavar = 'N', type = int, default = 200,
+                        help = '# candidates in a chunk (paralell search)')
+    parser.add_argument('-w', '--threads', action = 'store_true',
+                        help = 'paralell search by threads (-x: # threads)')
+    parser.add_argument('-H', '--hashshard', action = 'store_true',
+                        help = 'paralell search with memo sharded by hash')
+    parser.add_argument('-P', '--parentptr', action = 'store_true',
+                        help = 'keep move history by parent pointers')
+    parser.add_argument('-m', '--memo', choices = hm.MEMOTYPES,
+                        default = 'set',
+                        help = 'memo (searched boards) backend')
+    parser.add_argument('-l', '--layered', action = 'store_true',
+                        help = 'keep only the last 2 steps/RLCs in memo')
+    parser.add_argument('-e', '--extdir', metavar = 'DIR', default = '',
+                        help = 'external memory search on directory DIR')
+    parser.add_argument('-k', '--checkpoint', metavar = 'N', type = int,
+                        default = 0,
+                        help = 'save checkpoint on every N steps')
+    parser.add_argument('-u', '--resume', action = 'store_true',
+                        help = 'resume from the latest checkpoint')
+    parser.add_argument('-a', '--astar', action = 'store_true',
+                        help = 'best first (A*) search (optimal steps only)')
+    parser.add_argument('-i', '--idastar', action = 'store_true',
+                        help = 'iterative deepening A* (optimal steps only)')
+    parser.add_argument('-T', '--ttsize', metavar = 'N', type = int,
+                        default = 1 << 20,
+                        help = '# entries of transposition table (IDA*)')
+    parser.add_argument('-z', '--exactrlc', action = 'store_true',
+                        help = 'exact optimal RLC search by 0-1 BFS')
+    parser.add_argument('-B', '--bidir', action = 'store_true',
+                        help = 'bidirectional search (optimal steps only)')
+    parser.add_argument('-b', '--pdb', metavar = 'DIR', default = '',
+                        help = 'pattern databases in DIR (A*/IDA*)')
+    parser.add_argument('-y', '--numpy', action = 'store_true',
+                        help = 'numpy batched search (optimal steps only)')
     parser.add_argument('-c', '--checkonly', action = 'store_true',
                         help = 'check koma and print init/goal only')
     parser.add_argument('-v', '--version', action = 'version',
@@ -155,8 +237,80 @@ def getoptions() -> Options:
 #        opts.isoptrlc = False
     opts.stopsteps = args.stopsteps
     opts.maxnprocs = args.maxnprocs
-    opts.minnsearchdiv = args.minnsearchdiv
+    opts.chunksize = args.chunksize
+    if opts.chunksize < 1:
+        hi.errorstop('--chunksize must be >= 1')
     opts.ischeckonly = args.checkonly
+    opts.ishashshard = args.hashshard
+    if opts.ishashshard and not opts.isparalell:
+        hi.errorstop('cannot specify both --hashshard and --nonparalell')
+    opts.isthreads = args.threads
+    if opts.isthreads and not opts.isparalell:
+        hi.errorstop('cannot specify both --threads and --nonparalell')
+    if opts.isthreads and opts.ishashshard:
+        hi.errorstop('cannot specify both --threads and --hashshard')
+    opts.isparentptr = args.parentptr
+    opts.memotype = args.memo
+    opts.islayered = args.layered
+    opts.extdir = args.extdir
+    opts.ckptinterval = args.checkpoint
+    opts.isresume = args.resume
+    opts.ckptdir = \
+        os.path.splitext(os.path.basename(opts.filename))[0] + '.ckpt'
+    if opts.extdir != '' and opts.ishashshard:
+        hi.errorstop('cannot specify both --extdir and --hashshard')
+    if opts.extdir != '' and opts.isthreads:
+        hi.errorstop('cannot specify both --extdir and --threads')
+    if opts.isparentptr and opts.ishashshard:
+        hi.errorstop('cannot specify both --parentptr and --hashshard')
+    if opts.memotype == 'shm' and opts.ishashshard:
+        hi.errorstop('cannot specify --memo shm with --hashshard')
+    opts.isnumpy = args.numpy
+    opts.isastar = args.astar
+    opts.isidastar = args.idastar
+    opts.ttsize = args.ttsize
+    if opts.isastar and opts.isidastar:
+        hi.errorstop('cannot specify both --astar and --idastar')
+    if (opts.isastar or opts.isidastar) and \
+       (opts.isoptrlc or opts.ishashshard or opts.extdir != '' or
+        opts.isparentptr or opts.islayered or opts.isnumpy or
+        0 < opts.ckptinterval or opts.isresume):
+        hi.errorstop('cannot specify --astar/--idastar with --optrlc/' +
+                     '--hashshard/--extdir/--parentptr/--layered/--numpy/' +
+                     '--checkpoint/--resume')
+    opts.isbidir = args.bidir
+    if opts.isbidir and \
+       (opts.isoptrlc or opts.ishashshard or opts.extdir != '' or
+        opts.isparentptr or opts.islayered or opts.isnumpy or
+        0 < opts.ckptinterval or opts.isresume or
+        opts.isastar or opts.isidastar):
+        hi.errorstop('cannot specify --bidir with --optrlc/--hashshard/' +
+                     '--extdir/--parentptr/--layered/--numpy/' +
+                     '--checkpoint/--resume/--astar/--idastar')
+    opts.isexactrlc = args.exactrlc
+    if opts.isexactrlc:
+        if args.optsteps:
+            hi.errorstop('cannot specify both --exactrlc and --optsteps')
+        opts.isoptrlc = True
+        if opts.ishashshard or opts.extdir != '' or opts.isparentptr or \
+           opts.islayered or 0 < opts.ckptinterval or opts.isresume or \
+           opts.isbidir:
+            hi.errorstop('cannot specify --exactrlc with --hashshard/' +
+                         '--extdir/--parentptr/--layered/--checkpoint/' +
+                         '--resume/--bidir')
+    opts.pdbdir = args.pdb
+    if opts.pdbdir != '' and not (opts.isastar or opts.isidastar):
+        hi.errorstop('--pdb needs --astar or --idastar')
+    if opts.ttsize < 2:
+        hi.errorstop('--ttsize must be >= 2')
+    if opts.isnumpy and opts.isoptrlc:
+        hi.errorstop('cannot specify both --numpy and --optrlc')
+    if opts.isnumpy and not hv.ISNUMPY:
+        hi.errorstop('--numpy needs numpy module (not installed)')
+    if (0 < opts.ckptinterval or opts.isresume) and \
+       (opts.ishashshard or opts.extdir != ''):
+        hi.errorstop('cannot specify --checkpoint/--resume with ' +
+                     '--hashshard/--extdir')
 
     return opts
 
@@ -166,10 +320,29 @@ def hakosearch(puzzle: Puzzle, opts: Options) -> None:
     '''
     (paralell) horizontal search
     '''
+    if opts.ishashshard:
+        hakosearch_shard(puzzle, opts)
+        return
+    if opts.extdir != '':
+        hakosearch_disk(puzzle, opts)
+        return
+    if opts.isastar:
+        hakosearch_astar(puzzle, opts)
+        return
+    if opts.isidastar:
+        hakosearch_idastar(puzzle, opts)
+        return
+    if opts.isbidir:
+        hakosearch_bidir(puzzle, opts)
+        return
+    if opts.isexactrlc:
+        hakosearch_exactrlc(puzzle, opts)
+        return
     timer = time.time()
-    memoschash: set[Schash] = set()
+    memoschash = hm.makememo(puzzle, opts.memotype)
+    inithash = hi.hashcolist(puzzle, Colist(puzzle.initcolist))
     # put the init pos in memo
-    memoschash.add(hi.hashcolist(puzzle, Colist(puzzle.initcolist)))
+    memoschash.add(inithash)
     step = 0
     if opts.isoptrlc:
         startrlc = Rlc(0)
@@ -183,76 +356,701 @@ def hakosearch(puzzle: Puzzle, opts: Options) -> None:
         stepstr = 'RLC'
     else:
         childfunc = hakochild_optsteps
+        if opts.isnumpy:
+            childfunc = hv.hakochild_vec
         stepstr = 'step'
-    while 0 < (nsearch := len(tosearch)):
-        if nsearch <= opts.maxnprocs * opts.minnsearchdiv:
-            nprocs = (nsearch + opts.minnsearchdiv - 1) // opts.minnsearchdiv
-            nsearchdiv = opts.minnsearchdiv
+    # workers forked (threads started) on the 1st paralell step, then reused
+    # until the end
+    pool: Optional[hp.Hakopool | hp.Hakothreads] = None
+    poolmark = 't' if opts.isthreads else 'p'
+    # hashes added to memoschash but not yet handed to the workers
+    newmemo: hm.Memo = {inithash}
+    # (on layered search) hashes of the candidates on this step
+    lastlayer: set[Schash] = set(newmemo)
+    histstore: Optional[hi.Histstore] = None
+    if opts.isparentptr:
+        histstore = hi.Histstore()
+    ckpt: Optional[hc.Checkpoint] = None
+    if 0 < opts.ckptinterval or opts.isresume:
+        ckpt = hc.Checkpoint(puzzle, opts.ckptdir)
+        if opts.isresume:
+            memoschash = hm.makememo(puzzle, opts.memotype)
+            step, tosearch, lastlayer = ckpt.load(memoschash, opts.islayered,
+                                                  histstore)
+            newmemo = set(memoschash)
+            print(f'@resumed at {stepstr} {step} from {opts.ckptdir}')
         else:
-            nprocs = opts.maxnprocs
-            nsearchdiv = nsearch // opts.maxnprocs
-        if opts.isparalell and 1 < nprocs:
+            ckpt.start(inithash)
+    resumestep = step
+    nexpanded = 0
+    while 0 < (nsearch := len(tosearch)):
+        nexpanded += nsearch
+        if ckpt is not None and 0 < opts.ckptinterval and \
+           step % opts.ckptinterval == 0 and step != resumestep:
+            ckpt.save(step, tosearch, histstore)
+        nchunks = (nsearch + opts.chunksize - 1) // opts.chunksize
+        if opts.isparalell and 1 < nchunks:
             print(
-                f'---(p{nprocs}){stepstr}: {step}, cand: {len(tosearch)}, ' +
+                f'---({poolmark}{min(nchunks, opts.maxnprocs)}){stepstr}: ' +
+                f'{step}, cand: {len(tosearch)}, chunks: {nchunks}, ' +
                 f'time: {time.time() - timer}, memo: {len(memoschash)}'
             )
+            if pool is None and opts.isthreads:
+                pool = hp.Hakothreads(puzzle, childfunc, mergenextsearch,
+                                      opts.isoptrlc, opts.maxnprocs)
+            elif pool is None:
+                pool = hp.Hakopool(puzzle, childfunc, mergenextsearch,
+                                   opts.isoptrlc, opts.memotype,
+                                   opts.islayered, opts.maxnprocs)
             nextsearch: dict[Schash, Mcr] = dict()
-            st = 0
-            futures = []
             foundans: list[Mcr] = []
-            with concurrent.futures.ProcessPoolExecutor(
-#                    max_workers = MAXWORKERS
-                 ) as executor:
-#            with concurrent.futures.ProcessPoolExecutor(
-#                    max_workers = nprocs) as executor:
-#            with concurrent.futures.ThreadPoolExecutor() as executor:
-                for pn in range(nprocs):
-                    if pn < nprocs - 1: 
-                        ed = st + nsearchdiv
-                    else:
-                        ed = nsearch
-                    futures.append(
-                        executor.submit(childfunc, puzzle,
-                                        tosearch[st:ed], memoschash)
-                    )
-                    st = ed
-                del(tosearch[:])
-                for future in concurrent.futures.as_completed(futures):
-                    try:
-                        fachild, nschild = future.result()
-                    except Exception as e:
-                        print(f'error in task: {e}')
-                        sys.exit(11)
-                    foundans += fachild
+            # (shm/threads: the workers probe memoschash itself, no hashes
+            # sent)
+            if opts.memotype == 'shm' or opts.isthreads:
+                newmemo = memoschash
+            tjoin = 0.0
+            for fachild, nschild in pool.search(tosearch, opts.chunksize,
+                                                newmemo):
+                t = time.perf_counter()
+                foundans += fachild
+                # (merged by the workers, disjoint by hash)
+                nextsearch.update(nschild)
+                tjoin += time.perf_counter() - t
+            del(tosearch[:])
+            newmemo = set()
+            print('    idle: ' + ' '.join(f'{t:.3f}' for t in pool.idle) +
+                  f' (max {max(pool.idle):.3f} s)')
+        else:
+            print(
+                f'---{stepstr}: {step}, cand: {len(tosearch)}, ' +
+                f'time: {time.time() - timer}, memo: {len(memoschash)}'
+            )
+            foundans, nextsearch = childfunc(puzzle, tosearch, memoschash)
+            tjoin = -1.0
+        t = time.perf_counter()
+        if opts.islayered:
+# moves are reversible: the boards next to this step are in the last step,
+# this step or the next step. drop memo before the last step.
+            memoschash = hm.makememo(puzzle, opts.memotype)
+            memoschash.update(lastlayer)
+            lastlayer = set(nextsearch.keys())
+        memoschash.update(nextsearch.keys())
+        newmemo.update(nextsearch.keys())
+        if pool is not None and 0 <= tjoin:
+            print(f'    expand: {max(pool.busy):.3f} s, ' +
+                  f'merge: {max(pool.merge):.3f} s (workers) + ' +
+                  f'{tjoin:.3f} s (join) + ' +
+                  f'{time.perf_counter() - t:.3f} s (memo)')
+        if ckpt is not None:
+            ckpt.addstep(step + 1, nextsearch.keys())
+        if 0 < len(foundans):
+            print(
+                f'---after {stepstr}: {step}, cand: {nsearch}, ' +
+                f'time: {time.time() - timer}, memo: {len(memoschash)} ' +
+                f'({hm.memostat(memoschash)})'
+            )
+            print()
+            monitor(foundans)
+            if pool is not None:
+                pool.close()
+            if histstore is not None:
+                print(f'histstore: {len(histstore)} states, ' +
+                      f'{histstore.nbytes()} bytes')
+            print(f'expanded: {nexpanded} nodes')
+            hi.printbestans(puzzle, foundans, Colist(puzzle.initcolist),
+                            opts.isoptrlc, histstore)
+            # NEVERREACHED
+        if step == opts.stopsteps:
+            print(opts.stopsteps, time.time() - timer,
+                  hm.memostat(memoschash))
+            print('@stopped')
+# candidate monitor when stop
+        #    for mcr in nextsearch.values():
+        #        print(f'move: {mcr.movehist}')
+        #        printnamematrix(puzzle, mcr.colist)
+        #        print(f'rlc: {mcr.rlc}')
+            if pool is not None:
+                pool.close()
+            if ckpt is not None:
+                ckpt.save(step + 1, list(nextsearch.values()), histstore)
+                print(f'@checkpoint saved at {stepstr} {step + 1} ' +
+                      f'to {opts.ckptdir}')
+            exit(3)
+        if histstore is not None:
+            for mcr in nextsearch.values():
+                histstore.rebase(mcr)
+        del(tosearch)
+        tosearch = list(nextsearch.values())
+        del(nextsearch)
+        step += 1
+# candidate monitor by step
+#        for mcr in tosearch:
+#            print(f'move: {mcr.movehist}')
+#            hi.printnamematrix(puzzle, mcr.colist)
+#            print(f'rlc: {mcr.rlc}')
+    if pool is not None:
+        pool.close()
+    return
+
+
+def hakosearch_shard(puzzle: Puzzle, opts: Options) -> None:
+    '''
+    paralell horizontal search, memo & candidates sharded by hash:
+    the parent only counts, the workers own & merge their shards
+    '''
+    timer = time.time()
+    step = 0
+    if opts.isoptrlc:
+        startrlc = Rlc(0)
+        childfunc = hakochild_optrlc
+        stepstr = 'RLC'
+    else:
+        startrlc = Rlc(1)
+        childfunc = hakochild_optsteps
+        if opts.isnumpy:
+            childfunc = hv.hakochild_vec
+        stepstr = 'step'
+    shard = hp.Hakoshard(puzzle, childfunc, mergenextsearch, opts.isoptrlc,
+                         opts.memotype, opts.islayered, opts.maxnprocs)
+    shard.init(hi.hashcolist(puzzle, Colist(puzzle.initcolist)),
+               Mcr(Movehist((Move((Komaid(0), Dirid(0))), )),
+                   Colist(puzzle.initcolist), startrlc))
+    ncand = 1
+    nmemo = 1
+    nexpanded = 0
+    while 0 < ncand:
+        nexpanded += ncand
+        print(
+            f'---(s{opts.maxnprocs}){stepstr}: {step}, cand: {ncand}, ' +
+            f'time: {time.time() - timer}, memo: {nmemo}'
+        )
+        foundans, ncand, nmemo = shard.step()
+        if 0 < len(foundans):
+            print(
+                f'---after {stepstr}: {step}, cand: {ncand}, ' +
+                f'time: {time.time() - timer}, memo: {nmemo}'
+            )
+            print()
+            monitor(foundans)
+            shard.close()
+            print(f'expanded: {nexpanded} nodes')
+            hi.printbestans(puzzle, foundans, Colist(puzzle.initcolist),
+                            opts.isoptrlc)
+            # NEVERREACHED
+        if step == opts.stopsteps:
+            print(opts.stopsteps, time.time() - timer)
+            print('@stopped')
+            shard.close()
+            exit(3)
+        step += 1
+    shard.close()
+    return
+
+
+def hakosearch_disk(puzzle: Puzzle, opts: Options) -> None:
+    '''
+    external memory horizontal search (non paralell):
+    candidates of each step & memo are on files in opts.extdir,
+    duplicates are removed by sorted merge after each step
+    '''
+    timer = time.time()
+    ext = hd.Extbfs(puzzle, opts.extdir, opts.islayered)
+    step = 0
+    if opts.isoptrlc:
+        startrlc = Rlc(0)
+        childfunc = hakochild_optrlc
+        stepstr = 'RLC'
+    else:
+        startrlc = Rlc(1)
+        childfunc = hakochild_optsteps
+        if opts.isnumpy:
+            childfunc = hv.hakochild_vec
+        stepstr = 'step'
+    ext.init(Mcr(Movehist((Move((Komaid(0), Dirid(0))), )),
+                 Colist(puzzle.initcolist), startrlc))
+    nexpanded = 0
+    while 0 < (nsearch := ext.nrecs(step)):
+        nexpanded += nsearch
+        print(
+            f'---(e){stepstr}: {step}, cand: {nsearch}, ' +
+            f'time: {time.time() - timer}'
+        )
+        foundans: list[Mcr] = []
+        for tosearch in ext.frontier(step):
+            # (memo is not used: duplicates are removed by closelevel())
+            fachild, nschild = childfunc(puzzle, tosearch, set())
+            foundans += fachild
+            ext.addrun([ext.packrec(schash,
+                                    diskprio(puzzle, opts.isoptrlc, mcr),
+                                    mcr)
+                        for schash, mcr in nschild.items()])
+            del(nschild)
+        if 0 < len(foundans):
+            print(
+                f'---after {stepstr}: {step}, cand: {nsearch}, ' +
+                f'time: {time.time() - timer}'
+            )
+            print()
+            for mcr in foundans:
+                mcr.movehist = ext.movehist(step, mcr)
+                mcr.histbase = -1
+                mcr.nbase = 0
+            ext.cleanup()
+            print(f'expanded: {nexpanded} nodes')
+            hi.printbestans(puzzle, foundans, Colist(puzzle.initcolist),
+                            opts.isoptrlc)
+            # NEVERREACHED
+        ext.closelevel(step)
+        if step == opts.stopsteps:
+            print(opts.stopsteps, time.time() - timer)
+            print('@stopped')
+            ext.cleanup()
+            exit(3)
+        step += 1
+    ext.cleanup()
+    return
+
+
+def hakosearch_bidir(puzzle: Puzzle, opts: Options) -> None:
+    '''
+    bidirectional search for optimal steps (non paralell): horizontal
+    search from both the init & the goal (all the moves are reversible),
+    the smaller candidates are searched 1 step on each turn, and the
+    answer is joined on the board found by both.
+    the goal must be a board (goaltype BYCLSHASH).
+    '''
+    if puzzle.goaltype != Goaltype.BYCLSHASH:
+        hi.errorstop('--bidir needs the goal of all komas (byclshash)')
+    timer = time.time()
+    goalcolist = [Coords(0)] * (puzzle.nkoma + 1)
+    for kid, gco in puzzle.goal_koma:
+        goalcolist[kid] = gco
+    # [0]: from the init, [1]: from the goal
+    seen: list[dict[Schash, Mcr]] = []
+    tosearch: list[list[Mcr]] = []
+    for colist in (puzzle.initcolist, goalcolist):
+        mcr = Mcr(Movehist((Move((Komaid(0), Dirid(0))), )),
+                  Colist(tuple(colist)), Rlc(1))
+        seen.append({hi.hashcolist(puzzle, mcr.colist): mcr})
+        tosearch.append([mcr])
+    nsteps = [0, 0]
+    nexpanded = 0
+    meets = [(seen[0][schash], seen[1][schash]) for schash in seen[0]
+             if schash in seen[1]]
+    while len(meets) == 0:
+        print(
+            f'---(b)steps: {nsteps[0]} + {nsteps[1]}, ' +
+            f'cands: {len(tosearch[0])} + {len(tosearch[1])}, ' +
+            f'time: {time.time() - timer}, ' +
+            f'memo: {len(seen[0])} + {len(seen[1])}'
+        )
+        if len(tosearch[0]) == 0 or len(tosearch[1]) == 0:
+            return
+        if nsteps[0] + nsteps[1] == opts.stopsteps:
+            print(opts.stopsteps, time.time() - timer)
+            print('@stopped')
+            exit(3)
+        side = 0 if len(tosearch[0]) <= len(tosearch[1]) else 1
+        nexpanded += len(tosearch[side])
+        # (goals found are in seen[1]; on the goal side, the goal is cut
+        #  by the memo, not found)
+        foundans, nextsearch = \
+            hakochild_optsteps(puzzle, tosearch[side], seen[side],
+                               side == 0)
+        nsteps[side] += 1
+        for schash, mcr in nextsearch.items():
+            if schash in seen[1 - side]:
+                meets.append((mcr, seen[1][schash]) if side == 0 else
+                             (seen[0][schash], mcr))
+        if side == 0:
+            meets += [(mcr, seen[1][puzzle.goal_schash])
+                      for mcr in foundans]
+        seen[side].update(nextsearch)
+        tosearch[side] = list(nextsearch.values())
+    print(
+        f'---after steps: {nsteps[0]} + {nsteps[1]}, ' +
+        f'time: {time.time() - timer}, meets: {len(meets)}'
+    )
+    # the shortest of the meets (found on the boards of the goal side
+    # searched on different steps)
+    beststeps = min(len(fmcr.movehist) + len(bmcr.movehist)
+                    for fmcr, bmcr in meets)
+    foundans = [joinpath(puzzle, fmcr, bmcr) for fmcr, bmcr in meets
+                if len(fmcr.movehist) + len(bmcr.movehist) == beststeps]
+    print()
+    print(f'expanded: {nexpanded} nodes')
+    hi.printbestans(puzzle, foundans, Colist(puzzle.initcolist), False)
+    # NEVERREACHED
+
+
+def joinpath(puzzle: Puzzle, fmcr: Mcr, bmcr: Mcr) -> Mcr:
+    '''
+    moves of fmcr (from the init) + reverse of bmcr (from the goal) on the
+    same board (hash): the komas of a class may be swapped or mirrored on
+    the boards, so the moves to the goal are found by the hashes of the
+    boards of bmcr, back to the goal.
+    '''
+    colist = list(bmcr.colist)
+    backhash = []
+    for kid, dirid in bmcr.movehist[:0:-1]:
+        colist[kid] = Coords(colist[kid] - hi.dirvec[dirid])
+        backhash.append(hi.hashcolist(puzzle, Colist(tuple(colist))))
+    colist = list(fmcr.colist)
+    moves = list(fmcr.movehist)
+    for schash in backhash:
+        move = nextmove(puzzle, Colist(tuple(colist)), schash)
+        kid, dirid = move
+        colist[kid] = Coords(colist[kid] + hi.dirvec[dirid])
+        moves.append(move)
+    rlc = 1
+    for i in range(2, len(moves)):
+        if moves[i][0] != moves[i - 1][0]:
+            rlc += 1
+    return Mcr(Movehist(tuple(moves)), Colist(tuple(colist)), Rlc(rlc))
+
+
+def nextmove(puzzle: Puzzle, colist: Colist, schash: Schash) -> Move:
+    '''
+    a move from colist to the board of schash
+    '''
+    bmx = hi.makebmatrix(puzzle, colist)
+    for k in range(1, puzzle.nkoma + 1):
+        kid = Komaid(k)
+        kcls = puzzle.komacls[kid]
+        kbmx = hi.drawerasebmx(puzzle, kcls, colist[kid], bmx, mode = 0)
+        for dn in range(4):
+            if hi.movecollidep(puzzle, kcls, Dirid(dn), colist[kid], kbmx):
+                continue
+            newcolist = Colist(colist[:kid] +
+                               (Coords(colist[kid] + hi.dirvec[dn]), ) +
+                               colist[kid + 1:])
+            if hi.hashcolist(puzzle, newcolist) == schash:
+                return Move((kid, Dirid(dn)))
+    hi.errorstop('internal error: boards of bidirectional search not joined')
+
+
+def hakosearch_exactrlc(puzzle: Puzzle, opts: Options) -> None:
+    '''
+    exact optimal RLC search (non paralell): 0-1 BFS on the states of
+    (board, last moved koma): a move of the last moved koma costs 0 RLC,
+    of other koma costs 1.  states are taken out in the order of RLC (the
+    deque keeps RLC R at the front, R + 1 at the back), and # steps of a
+    state is improved on the same RLC, so the goal of the least # steps on
+    the optimal RLC is taken after all the states of the RLC are searched.
+    '''
+    timer = time.time()
+    # moves of all the states pushed (never changed, so that the history
+    # is consistent even if a state is improved later): parent #, move
+    parent = array('q')
+    moves = array('H')   # (KOMAID << 2 | DIRID)
+    # best (RLC << 24 | # steps) of state key (SCHASH << 16 | KOMACLS << 8 |
+    #   coords of the last moved koma, on the hash side board)
+    best: dict[int, int] = dict()
+    initcolist = Colist(puzzle.initcolist)
+    initkey = hi.hashcolist(puzzle, initcolist) << 16
+    best[initkey] = 0
+    # (RLC, # steps, # of the push, COLIST, last moved KOMAID, state key)
+    queue: deque[tuple[int, int, int, Colist, int, int]] = \
+        deque([(0, 0, -1, initcolist, 0, initkey)])
+    bw = cox(puzzle.bsize)
+    goals: list[tuple[int, int, Colist]] = []  # (# steps, # of push, COLIST)
+    goalrlc = -1
+    lastrlc = -1
+    nexpanded = 0
+    while 0 < len(queue):
+        rlc, nsteps, pn, colist, lastkid, key = queue.popleft()
+        if best[key] != (rlc << 24 | nsteps):  # improved after pushed
+            continue
+        if 0 <= goalrlc < rlc:
+            break
+        if rlc != lastrlc:
+            print(
+                f'---(z)rlc: {rlc}, expanded: {nexpanded}, ' +
+                f'queue: {len(queue)}, time: {time.time() - timer}, ' +
+                f'memo: {len(best)}'
+            )
+            if 0 <= opts.stopsteps < rlc:
+                print(opts.stopsteps, time.time() - timer)
+                print('@stopped')
+                exit(3)
+            lastrlc = rlc
+        if hi.isgoal(puzzle, colist, Schash(key >> 16)):
+            goals.append((nsteps, pn, colist))
+            goalrlc = rlc
+            continue
+        nexpanded += 1
+        bmx = hi.makebmatrix(puzzle, colist)
+        near = hi.gapnear(puzzle, bmx)
+        hb = hi.hashbase(puzzle, colist)
+        for k in range(1, puzzle.nkoma + 1):
+            kid = Komaid(k)
+            kcls = puzzle.komacls[kid]
+            kmask = puzzle.clsmask[kcls][colist[kid]]
+            if kmask & near == 0:
+                continue
+            kbmx = Bmatrix(bmx ^ kmask)
+            newrlc = rlc if kid == lastkid else rlc + 1
+            kw = cox(puzzle.clssiz[kcls])
+            for dn in range(4):
+                if hi.movecollidep(puzzle, kcls, Dirid(dn), colist[kid],
+                                   kbmx):
+                    continue
+                co = Coords(colist[kid] + hi.dirvec[dn])
+                r, rr = hi.hashmovepair(puzzle, hb, kid, colist[kid], co)
+                # coords of kid on the board of the hash (r or mirror rr)
+                mco = (co & 0xf0) | (bw - cox(co) - kw)
+                if rr < r:
+                    kco = mco
+                elif r == rr:
+                    kco = min(co, mco)
+                else:
+                    kco = co
+                newkey = min(r, rr) << 16 | kcls << 8 | kco
+                label = newrlc << 24 | (nsteps + 1)
+                if best.get(newkey, label + 1) <= label:
+                    continue
+                best[newkey] = label
+                parent.append(pn)
+                moves.append(kid << 2 | dn)
+                item = (newrlc, nsteps + 1, len(parent) - 1,
+                        Colist(colist[:kid] + (co, ) + colist[kid + 1:]),
+                        kid, newkey)
+                if newrlc == rlc:
+                    queue.appendleft(item)
+                else:
+                    queue.append(item)
+    if len(goals) == 0:
+        return
+    print(
+        f'---after rlc: {goalrlc}, expanded: {nexpanded}, ' +
+        f'time: {time.time() - timer}, memo: {len(best)}'
+    )
+    nsteps, pn, colist = min(goals)
+    hist = []
+    while 0 <= pn:
+        hist.append(Move((Komaid(moves[pn] >> 2), Dirid(moves[pn] & 3))))
+        pn = parent[pn]
+    print()
+    print(f'expanded: {nexpanded} nodes')
+    hi.printbestans(puzzle, [Mcr(Movehist((Move((Komaid(0), Dirid(0))), ) +
+                                         tuple(hist[::-1])),
+                                colist, Rlc(goalrlc))],
+                    initcolist, True)
+    # NEVERREACHED
+
+
+def makeheur(puzzle: Puzzle, opts: Options) -> hh.Heuristic:
+    '''
+    lower bound of # steps for -a/-i, with pattern databases if -b
+    '''
+    if opts.pdbdir == '':
+        return hh.Heuristic(puzzle)
+    pdbset = hb.Pdbset(puzzle, opts.pdbdir)
+    print(f'# pattern database: {pdbset.describe()}')
+    return hh.Heuristic(puzzle, pdbset)
+
+
+def hakosearch_astar(puzzle: Puzzle, opts: Options) -> None:
+    '''
+    best first (A*) search for optimal steps (non paralell):
+    candidates are taken out in the order of # steps + lower bound of
+    # steps to the goal (hakoheur.py), the 1st goal taken out is step
+    optimal.  the goals of the same F are collected, and the best RLC is
+    taken (as BFS)
+    '''
+    timer = time.time()
+    heur = makeheur(puzzle, opts)
+    closed = hm.makememo(puzzle, opts.memotype)
+    openlist = hh.Openlist()
+    initmcr = Mcr(Movehist((Move((Komaid(0), Dirid(0))), )),
+                  Colist(puzzle.initcolist), Rlc(1))
+    openlist.push(hi.hashcolist(puzzle, initmcr.colist), initmcr,
+                  0, heur(initmcr.colist), initmcr.rlc * 2)
+    nexpanded = 0
+    lastf = -1
+    foundans: list[Mcr] = []
+    while (top := openlist.pop()) is not None:
+        f, schash, mcr = top
+        if schash in closed:
+            continue
+        if f != lastf:
+            if 0 < len(foundans):
+                break
+            print(
+                f'---(a)f: {f}, expanded: {nexpanded}, ' +
+                f'open: {len(openlist)}, time: {time.time() - timer}, ' +
+                f'memo: {len(closed)}'
+            )
+            lastf = f
+        if hi.isgoal(puzzle, mcr.colist, schash):
+            foundans.append(mcr)
+            continue
+        # (the rest of F after a goal: as deep as the goal, not expanded)
+        if 0 < len(foundans):
+            continue
+        if 0 <= opts.stopsteps < f:
+            print(opts.stopsteps, time.time() - timer)
+            print('@stopped')
+            exit(3)
+        closed.add(schash)
+        nexpanded += 1
+        # (goals are checked when taken out, not when found)
+        childans, nextsearch = hakochild_optsteps(puzzle, [mcr], closed)
+        g = len(mcr.movehist)  # steps of the children
+        for fmcr in childans:
+            openlist.push(hi.hashcolist(puzzle, fmcr.colist), fmcr, g, 0,
+                          diskprio(puzzle, False, fmcr))
+        for nschash, nmcr in nextsearch.items():
+            openlist.push(nschash, nmcr, g, heur(nmcr.colist),
+                          diskprio(puzzle, False, nmcr))
+    if 0 < len(foundans):
+        print(
+            f'---after f: {lastf}, expanded: {nexpanded}, ' +
+            f'time: {time.time() - timer}, memo: {len(closed)} ' +
+            f'({hm.memostat(closed)})'
+        )
+        print()
+        print(f'expanded: {nexpanded} nodes')
+        hi.printbestans(puzzle, foundans, Colist(puzzle.initcolist), False)
+        # NEVERREACHED
+    return
+
+
+def hakosearch_idastar(puzzle: Puzzle, opts: Options) -> None:
+    '''
+    iterative deepening A* (IDA*) for optimal steps (non paralell):
+    DFS within the bound of # steps + lower bound of # steps to the goal
+    (hakoheur.py), the bound is raised to the smallest exceeded on the
+    last iteration. duplicates are cut by the fixed size transposition
+    table (opts.ttsize entries), so the memory does not grow with the
+    searched boards.  the iteration a goal is found on is finished, and
+    the best RLC of the goals is taken (as BFS)
+    '''
+    timer = time.time()
+    heur = makeheur(puzzle, opts)
+    tt = hm.Transtable(puzzle, opts.ttsize)
+    initmcr = Mcr(Movehist((Move((Komaid(0), Dirid(0))), )),
+                  Colist(puzzle.initcolist), Rlc(1))
+    inithash = hi.hashcolist(puzzle, initmcr.colist)
+    bound = heur(initmcr.colist)
+    nexpanded = 0
+    while True:
+        print(
+            f'---(i)bound: {bound}, expanded: {nexpanded}, ' +
+            f'time: {time.time() - timer}'
+        )
+        if 0 <= opts.stopsteps < bound:
+            print(opts.stopsteps, time.time() - timer)
+            print('@stopped')
+            exit(3)
+        tt.newiteration()
+        nextbound = -1
+        foundans: list[Mcr] = []
+        # DFS stack: children (H, SCHASH, MCR) not searched yet, by depth
+        #   (MCR has the last move only, nbase == # steps: the moves are
+        #    kept in path)
+        stack: list[list[tuple[int, Schash, Mcr]]] = \
+            [[(bound, inithash, initmcr)]]
+        path: list[Move] = []
+        while 0 < len(stack):
+            if len(stack[-1]) == 0:
+                stack.pop()
+                continue
+            h, schash, mcr = stack[-1].pop()
+            g = mcr.nbase
+            if bound < g + h:
+                if nextbound < 0 or g + h < nextbound:
+                    nextbound = g + h
+                continue
+            if 0 < g:
+                del(path[g - 1:])
+                path.append(mcr.movehist[-1])
+            if hi.isgoal(puzzle, mcr.colist, schash):
+                mcr.movehist = Movehist((Move((Komaid(0), Dirid(0))), ) +
+                                        tuple(path))
+                mcr.nbase = 0
+                foundans.append(mcr)
+                continue
+            # visited with less steps, or the same steps & better RLC
+            prio = diskprio(puzzle, False, mcr) if 0 < g else mcr.rlc * 2
+            if not tt.visit(schash, g, prio):
+                continue
+            nexpanded += 1
+            # (goals are checked when taken out, not when found)
+            childans, nextsearch = hakochild_optsteps(puzzle, [mcr], set())
+            children = [(0, hi.hashcolist(puzzle, fmcr.colist), fmcr)
+                        for fmcr in childans] + \
+                       [(heur(nmcr.colist), nschash, nmcr)
+                        for nschash, nmcr in nextsearch.items()]
+            for c in children:
+                c[2].nbase = g + 1
+                c[2].movehist = Movehist(c[2].movehist[-1:])
+            # (taken out from the last: the smallest h first)
+            children.sort(key = lambda c: (-c[0], -c[2].rlc))
+            stack.append(children)
+        if 0 < len(foundans):
+            print(
+                f'---after bound: {bound}, expanded: {nexpanded}, ' +
+                f'time: {time.time() - timer}, ' +
+                f'tt: {tt.nstored}/{2 * tt.nbuckets} ' +
+                f'(replaced {tt.nreplaced}, {tt.nbytes()} bytes)'
+            )
+            print()
+            print(f'expanded: {nexpanded} nodes')
+            hi.printbestans(puzzle, foundans, Colist(puzzle.initcolist),
+                            False)
+            # NEVERREACHED
+        if nextbound < 0:
+            return
+        bound = nextbound
+
+
+def diskprio(puzzle: Puzzle, isoptrlc: bool, mcr: Mcr) -> int:
+    '''
+    priority of mcr among the same board (smaller is better):
+    same as mergenextsearch()
+    '''
+    if isoptrlc:
+        return mcr.nbase + len(mcr.movehist)
+    bmx = hi.mcrbmatrix(puzzle, mcr, xkoma = mcr.movehist[-1][0])
+    if cancontigmove(puzzle, bmx, mcr.colist, mcr.movehist[-1]):
+        return mcr.rlc * 2
+    return mcr.rlc * 2 + 1
+
+
+def mergenextsearch(puzzle: Puzzle, isoptrlc: bool,
+                    nextsearch: dict[Schash, Mcr],
+                    nschild: dict[Schash, Mcr]) -> None:
+    '''
+    merge child's result nschild into nextsearch (by pointer)
+    '''
 ## to ignore optimal #steps on optrlc search:
 ##   or optimal #rectlinear-counts on optsteps search (force update)
-#                    nextsearch.update(nschild)
-                    if opts.isoptrlc:
+#    nextsearch.update(nschild)
+    if isoptrlc:
 # take account of optimal #steps on optrlc search:
-                        for schash, mcr in nschild.items():
-                            if not schash in nextsearch or \
-                               len(mcr.movehist) < \
-                                            len(nextsearch[schash].movehist):
-                                nextsearch[schash] = mcr
-                            #if not schash in nextsearch:
-                            #    nextsearch[schash] = mcr
-                            #elif len(mcr.movehist) < \
-                            #                len(nextsearch[schash].movehist):
-                            #    print('+', end = '')
-                            #    nextsearch[schash] = mcr
-                    else:
+        for schash, mcr in nschild.items():
+            if not schash in nextsearch or \
+               mcr.nbase + len(mcr.movehist) < \
+                   nextsearch[schash].nbase + len(nextsearch[schash].movehist):
+                nextsearch[schash] = mcr
+            #if not schash in nextsearch:
+            #    nextsearch[schash] = mcr
+            #elif len(mcr.movehist) < len(nextsearch[schash].movehist):
+            #    print('+', end = '')
+            #    nextsearch[schash] = mcr
+    else:
 # take account of optimal #rectlinear-counts on optsteps search: (note A)
-                        for schash, mcr in nschild.items():
-                            if not schash in nextsearch or \
-                               mcr.rlc < nextsearch[schash].rlc:
-                                nextsearch[schash] = mcr
-                            elif mcr.rlc == nextsearch[schash].rlc:
-                                kid = mcr.movehist[-1][0]
-                                bmx = hi.makebmatrix(puzzle, mcr.colist,
-                                                     xkoma = kid)
-                                if cancontigmove(puzzle, bmx, mcr.colist,
-                                                 mcr.movehist[-1]):
-                                    nextsearch[schash] = mcr
+        for schash, mcr in nschild.items():
+            if not schash in nextsearch or \
+               mcr.rlc < nextsearch[schash].rlc:
+                nextsearch[schash] = mcr
+            elif mcr.rlc == nextsearch[schash].rlc:
+                kid = mcr.movehist[-1][0]
+                bmx = hi.mcrbmatrix(puzzle, mcr, xkoma = kid)
+                if cancontigmove(puzzle, bmx, mcr.colist, mcr.movehist[-1]):
+                    nextsearch[schash] = mcr
+    return
 # note A:
 #  optimal rectilinear steps is the problem of
 #  keep/override dict when different value with same key comes:
@@ -293,52 +1091,18 @@ def hakosearch(puzzle: Puzzle, opts: Options) -> None:
 #   if both the move in dic and overriding move is contigurous move
 #   (always overrides), >= 2 steps after may not be the optimal rlc.
 
-        else:
-            print(
-                f'---{stepstr}: {step}, cand: {len(tosearch)}, ' +
-                f'time: {time.time() - timer}, memo: {len(memoschash)}'
-            )
-            foundans, nextsearch = childfunc(puzzle, tosearch, memoschash)
-        memoschash |= set(nextsearch.keys())
-        if 0 < len(foundans):
-            print(
-                f'---after {stepstr}: {step}, cand: {len(tosearch)}, ' +
-                f'time: {time.time() - timer}, memo: {len(memoschash)}'
-            )
-            print()
-            monitor(foundans)
-            hi.printbestans(puzzle, foundans, Colist(puzzle.initcolist),
-                            opts.isoptrlc)
-            # NEVERREACHED
-        if step == opts.stopsteps:
-            print(opts.stopsteps, time.time() - timer)
-            print('@stopped')
-# candidate monitor when stop
-        #    for mcr in nextsearch.values():
-        #        print(f'move: {mcr.movehist}')
-        #        printnamematrix(puzzle, mcr.colist)
-        #        print(f'rlc: {mcr.rlc}')
-            exit(3)
-        del(tosearch)
-        tosearch = list(nextsearch.values())
-        del(nextsearch)
-        step += 1
-# candidate monitor by step
-#        for mcr in tosearch:
-#            print(f'move: {mcr.movehist}')
-#            hi.printnamematrix(puzzle, mcr.colist)
-#            print(f'rlc: {mcr.rlc}')
-    return
-
 
 def hakochild_optsteps(puzzle: Puzzle,
-              tosearch: list[Mcr], memoschash: set[Schash]
+              tosearch: list[Mcr], memoschash: hm.Memoview,
+              isgoalcheck: bool = True
              ) -> tuple[list[Mcr], dict[Schash, Mcr]]:
     '''
     returns foundans, {SCHASH: (MOVES, COLIST, RLC), ...}
     where foundans = [MCR, ...]
           SCLIST = hi.hashcolist(COLIST)
           RLC = rectlinear count in MOVES
+    isgoalcheck: False on the search from the goal (-B), the goal is
+    taken as any other board (cut by the memo)
     '''
 
 #    monitor(f'(c)@{len(tosearch)}')
@@ -348,14 +1112,18 @@ def hakochild_optsteps(puzzle: Puzzle,
         movehist = mcr.movehist
         colist = mcr.colist
         rlc = mcr.rlc
-        bmx = hi.makebmatrix(puzzle, colist)
+        bmx = hi.mcrbmatrix(puzzle, mcr)
+        near = hi.gapnear(puzzle, bmx)
+        hb = hi.hashbase(puzzle, colist)
 # pre-collision-judgement: in opt-steps search, it makes slower
 #   because of making of gapproj/komaproj
 #        gapproj = mkgapproj(puzzle.bsize, bmx)
         for k in range(1, puzzle.nkoma + 1):
             kid = Komaid(k)
-            hi.drawerasebmx(puzzle, puzzle.komacls[kid], colist[kid],
-                            bmx, mode = 0) # erase rect
+            kmask = puzzle.clsmask[puzzle.komacls[kid]][colist[kid]]
+            if kmask & near == 0:  # not next to any gap, cannot move
+                continue
+            kbmx = Bmatrix(bmx ^ kmask) # erase rect
 # pre-collision-judgement
 #            komaproj = mkkomaproj(mcr.colist[kid],
 #                                     puzzle.clssiz[puzzle.komacls[kid]])
@@ -369,8 +1137,8 @@ def hakochild_optsteps(puzzle: Puzzle,
                    continue
 #                monitor(f'{kid} moves to {dirid}: ')
                 co = Coords(colist[kid] +  hi.dirvec[dirid])
-                if hi.collidep(co, puzzle.clssiz[puzzle.komacls[kid]],
-                               puzzle.clsshape[puzzle.komacls[kid]], bmx):
+                if hi.movecollidep(puzzle, puzzle.komacls[kid], dirid,
+                                   colist[kid], kbmx):
 #                    monitor('... cannot move')
                     continue
 #Colist == list version
@@ -381,15 +1149,17 @@ def hakochild_optsteps(puzzle: Puzzle,
                                          colist[kid + 1:])
                 newmovehist = Movehist(
                     movehist + (Move((kid, dirid)), ))
-                newschash = hi.hashcolist(puzzle, newcolist)
+                newschash = hi.hashmove(puzzle, hb, kid, colist[kid], co)
                 newrlc = rlc
-                if 3 <= len(newmovehist) and \
+                if 3 <= mcr.nbase + len(newmovehist) and \
                    newmovehist[-1][0] != newmovehist[-2][0]:
                     # MOVE: (KOMAID, DIRID)
                     # (after step 2) and (moved kid != last moved kid)
                     newrlc = Rlc(newrlc + 1)
-                if hi.isgoal(puzzle, newcolist, newschash):  # answer found
-                    foundans.append(Mcr(newmovehist, newcolist, newrlc))
+                if isgoalcheck and \
+                   hi.isgoal(puzzle, newcolist, newschash):  # answer found
+                    foundans.append(Mcr(newmovehist, newcolist, newrlc,
+                                        mcr.histbase, mcr.nbase))
                     print('@found')
                     continue
 #                monitor(hi.makebmatrix(puzzle, newpos, None))
@@ -401,19 +1171,19 @@ def hakochild_optsteps(puzzle: Puzzle,
                     if not newschash in nextsearch or \
                        newrlc < nextsearch[newschash].rlc or \
                        (newrlc == nextsearch[newschash].rlc and \
-                        cancontigmove(puzzle, bmx,
+                        cancontigmove(puzzle, kbmx,
                                       newcolist, newmovehist[-1])):
                         nextsearch[newschash] = \
-                            Mcr(newmovehist, newcolist, newrlc)
+                            Mcr(newmovehist, newcolist, newrlc,
+                                mcr.histbase, mcr.nbase,
+                                Bmatrix(kbmx | puzzle.clsmask[
+                                    puzzle.komacls[kid]][co]))
                         monitor(
                             f'added ({newmovehist}, {newcolist}, {newrlc}) '\
                              + f'at {newschash}')
 #                else:
 #                    monitor(f'... {newschash} in memo')
-            # done 4 dir search
-            hi.drawerasebmx(puzzle, puzzle.komacls[kid], colist[kid],
-                            bmx, mode = 1)
-            # draw rect, recover koma
+            # done 4 dir search (bmx is kept as is, kbmx is dropped)
 #    monitor(f'>(c)checked {len(tosearch)}, ret {len(nextsearch)}')
 #    for h, mcr in nextsearch.items():
 #        print(h)
@@ -430,9 +1200,8 @@ def cancontigmove(puzzle: Puzzle, bmx: Bmatrix,
     for dirid in range(4):
         if (lastmdir - dirid + 4) % 4 == 2:  # opposit direction
             continue
-        co = Coords(lastco + hi.dirvec[dirid])
-        if not hi.collidep(co, puzzle.clssiz[puzzle.komacls[lastmkoma]],
-                           puzzle.clsshape[puzzle.komacls[lastmkoma]], bmx):
+        if not hi.movecollidep(puzzle, puzzle.komacls[lastmkoma],
+                               Dirid(dirid), lastco, bmx):
             return True
     return False
 
@@ -457,10 +1226,11 @@ def mkgapproj(bsize: Coords, bmx: Bmatrix) -> Projection:
     gpm = gpj
     gpy = 0
     for y in range(coy(bsize) - 2, 0, -1):
-        gpj &= bmx[y]
-        gpy = (gpy << 1) | (bmx[y] != gpm)
-#    for y in range(len(bmx)):
-#        print(bin(bmx[y])[-1:1:-1])
+        row = hi.bmxrow(bmx, y)
+        gpj &= row
+        gpy = (gpy << 1) | (row != gpm)
+#    for y in range(coy(bsize)):
+#        print(bin(hi.bmxrow(bmx, y))[-1:1:-1])
 #    print(bin(gpy << 1), bin(~gpj & gpm))
     return Projection((gpy << 1, ~gpj & gpm))
 
@@ -521,101 +1291,65 @@ def precollidep(dn: int, gapproj: Projection, komaproj: Projection) \
 
 
 def hakochild_optrlc(puzzle: Puzzle,
-              tosearch: list[Mcr], memoschash: set[Schash]
+              tosearch: list[Mcr], memoschash: hm.Memoview
              ) -> tuple[list[Mcr], dict[Schash, Mcr]]:
     '''
     returns foundans: list[Mcr],
             nextsearch: {SCHASH: (MOVES, COLIST, RLC), ...}
       where SCHASH = hi.hashcolist(COLIST)
+    one RL move: every coords the koma reaches by moving only the koma
+    (flood fill on the board with the koma erased), by the shortest moves.
+    (boards on the way of the move may be in memo, the move doesnot stop)
     '''
-    def contigmove(kid: Komaid, mcr: Mcr, perpet: list[Coords],
-                   bmx: Bmatrix,
-                   memoschash: set[Schash], nextsearch: dict[Schash, Mcr],
-                   foundans: list[Mcr],
-                   gapproj: Projection = Projection((0, 0)),
-                   komaproj: Projection = Projection((0, 0))
-                   ) -> None:
-        '''
-        recursive DFS:
-        try to move only (the same koma) kid until it cannot move
-        or the hash(board) becomes as the same one in the momoschash.
-        returns None, but appends new candidates (by pointer of nextsearch),
-                                  found answer (by pointer of foundans)
-                          if exist.
-        '''
-#        print(f'@{mcr.movehist[-1]}')
-#        hi.printnamematrix(puzzle, mcr.colist)
-#        for r in bmx:
-#            print(bin(r)[-1:1:-1])
-        movehist = mcr.movehist
-        colist = mcr.colist
-        rlc = mcr.rlc # is already increased if called by hakochild
-                      # (not increased when called by itself)
-        for dn in range(4):
-            isprecollide, gapproj = precollidep(dn, gapproj, komaproj)
-            if isprecollide:
-                continue
-            dirid = Dirid(dn)
-            newco = Coords(colist[kid] +  hi.dirvec[dirid])
-            if newco in perpet or \
-               hi.collidep(newco, puzzle.clssiz[puzzle.komacls[kid]],
-                           puzzle.clsshape[puzzle.komacls[kid]], bmx):
-#                monitor('... cannot move or perpetual')
-                continue
-            newmovehist = Movehist(movehist + (Move((kid, dirid)), ))
-            newcolist = Colist(colist[:kid] + (newco, ) + colist[kid + 1:])
-            newschash = hi.hashcolist(puzzle, newcolist)
-            if hi.isgoal(puzzle, newcolist, newschash):  # answer found
-                foundans.append(Mcr(newmovehist, newcolist, rlc))
-                print('@found')
-                return  # only 1 ans may be found in one RL move
-            if not newschash in memoschash and \
-               (not newschash in nextsearch or \
-                len(newmovehist) < len(nextsearch[newschash].movehist)
-               ):
-            #if not newschash in memoschash:
-            #  if not newschash in nextsearch:
-            #    nextsearch[newschash] = Mcr(newmovehist, newcolist, rlc)
-            #  elif len(newmovehist) < len(nextsearch[newschash].movehist):
-            #    print('.', end = '')
-                nextsearch[newschash] = Mcr(newmovehist, newcolist, rlc)
-#                monitor(
-#                    f'added ({newmovehist}, {newcolist}, {rlc}) '\
-#                    + f'at {newschash} (cont move)')
-#            else:
-#                monitor(f'{newschash} in memo or (in cand and not shorter) ' +
-#                        '(cont move)')
-            contigmove(kid, Mcr(newmovehist, newcolist, rlc), perpet + [newco],
-                       bmx, memoschash, nextsearch, foundans,
-                       gapproj = gapproj, komaproj = komaproj)
-        return
-
 #    monitor(f'(c)@{len(tosearch)}')
     nextsearch: dict[Schash, Mcr] = dict()
-#    for (moves, colist, rlc) in tosearch:
-#    print('@@', memoschash)
     foundans: list[Mcr] = []
     for mcr in tosearch:
-        bmx = hi.makebmatrix(puzzle, mcr.colist)
-        gapproj = mkgapproj(puzzle.bsize, bmx)
+        colist = mcr.colist
+        bmx = hi.mcrbmatrix(puzzle, mcr)
+        near = hi.gapnear(puzzle, bmx)
+        hb = hi.hashbase(puzzle, colist)
         mcr.rlc = Rlc(mcr.rlc + 1)
+        nsteps = mcr.nbase + len(mcr.movehist)
         for k in range(1, puzzle.nkoma + 1):
             kid = Komaid(k)
             if mcr.movehist[-1][0] == kid:
                 # the same koma as the last doesnot move (it's optrlc)
                 continue
-            hi.drawerasebmx(puzzle, puzzle.komacls[kid], mcr.colist[kid],
-                            bmx, mode = 0) # erase koma
-            komaproj = mkkomaproj(mcr.colist[kid],
-                                     puzzle.clssiz[puzzle.komacls[kid]])
-            contigmove(kid, mcr, [], bmx, memoschash, nextsearch, foundans,
-                       gapproj = gapproj, komaproj = komaproj)
-            hi.drawerasebmx(puzzle, puzzle.komacls[kid], mcr.colist[kid],
-                            bmx, mode = 1) # draw (recover) koma
+            kcls = puzzle.komacls[kid]
+            kco = colist[kid]
+            kmask = puzzle.clsmask[kcls][kco]
+            if kmask & near == 0:  # not next to any gap, cannot move
+                continue
+            kbmx = Bmatrix(bmx ^ kmask) # erase koma
+            reached, pdir = hi.komareach(puzzle, kcls, kco, kbmx)
+            for newco in reached:
+                newschash = hi.hashmove(puzzle, hb, kid, kco, newco)
+                newcolist = Colist(colist[:kid] + (newco, ) + colist[kid + 1:])
+                isgoal = hi.isgoal(puzzle, newcolist, newschash)
+                if not isgoal and \
+                   (newschash in memoschash or
+                    (newschash in nextsearch and
+                     nextsearch[newschash].nbase +
+                     len(nextsearch[newschash].movehist) <= nsteps)):
+                    continue
+                dirs = hi.reachpath(kco, newco, pdir)
+                newmcr = Mcr(Movehist(mcr.movehist +
+                                      tuple(Move((kid, dirid))
+                                            for dirid in dirs)),
+                             newcolist, mcr.rlc, mcr.histbase, mcr.nbase,
+                             Bmatrix(kbmx | puzzle.clsmask[kcls][newco]))
+                if isgoal:  # answer found
+                    foundans.append(newmcr)
+                    print('@found')
+                    continue
+                # (reached is nearest first: shorter than others of the
+                #  same koma, compare with the moves of other komas)
+                if not newschash in nextsearch or \
+                   nsteps + len(dirs) < nextsearch[newschash].nbase + \
+                                        len(nextsearch[newschash].movehist):
+                    nextsearch[newschash] = newmcr
 #    monitor(f'>(c)checked {len(tosearch)}, ret {len(nextsearch)}')
-#    for h, mcr in nextsearch.items():
-#        print(f'{len(mcr.movehist) - 1} ({hex(h)})')
-#        hi.printnamematrix(puzzle, mcr.colist)
     return foundans, nextsearch
 
 #........................................................................
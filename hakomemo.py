@@ -0,0 +1,376 @@
+#
+# hakomemo.py:
+#   memo (visited set of boards) backends for hakoiri.py
+#   set:   python set[Schash] (default)
+#   array: open addressing hash table on array('Q'),
+#          Schash packed to the minimum bits for the board
+#   shm:   the array table on a shared memory block, written by the parent
+#          between steps, probed by the workers directly (not copied)
+#
+from array import array
+from multiprocessing import shared_memory
+import os
+import sys
+from typing import Iterable, Iterator, Optional, Protocol
+
+from hakocom import Schash, Puzzle
+from hakocom import cox, coy
+
+MEMOTYPES = ['set', 'array', 'shm']
+
+
+#------------------------------------------------------------------------
+# packing of Schash
+#
+class Schpacker:
+    '''
+    Schash (8 bits (YYYY XXXX) x nkoma, class sorted) <-> packed int:
+    each coords is numbered in the positions its koma class can take,
+    and packed in mixed radix.
+    '''
+    def __init__(self, puzzle: Puzzle) -> None:
+        self.nkoma = puzzle.nkoma
+        by, bx = coy(puzzle.bsize) - 2, cox(puzzle.bsize) - 2
+        # radix & width of positions of the koma in i-th place of Sclist
+        self.radix: list[int] = []
+        self.width: list[int] = []
+        for kcls in range(1, len(puzzle.clssiz)):
+            ky, kx = coy(puzzle.clssiz[kcls]), cox(puzzle.clssiz[kcls])
+            for i in range(puzzle.clsofs[kcls], puzzle.clsofs[kcls + 1]):
+                self.width.append(bx - kx + 1)
+                self.radix.append((by - ky + 1) * (bx - kx + 1))
+        maxkey = 1
+        for r in self.radix:
+            maxkey *= r
+        self.bits = maxkey.bit_length()  # of (key + 1)
+        return
+
+    def pack(self, schash: Schash) -> int:
+        key = 0
+        for i, co in enumerate(schash.to_bytes(self.nkoma, 'big')):
+            key = key * self.radix[i] + \
+                  ((co >> 4) - 1) * self.width[i] + (co & 0xf) - 1
+        return key
+
+    def unpack(self, key: int) -> Schash:
+        cos = bytearray(self.nkoma)
+        for i in range(self.nkoma - 1, -1, -1):
+            key, pos = divmod(key, self.radix[i])
+            y, x = divmod(pos, self.width[i])
+            cos[i] = ((y + 1) << 4) | (x + 1)
+        return Schash(int.from_bytes(cos, 'big'))
+
+
+#------------------------------------------------------------------------
+# array backed memo
+#
+class Arraymemo:
+    '''
+    set[Schash] like memo: linear probing hash table of (packed key + 1)
+    in array('Q'), nwords x 64 bits per slot (0: empty).
+    '''
+    INITSLOTS = 1 << 10
+
+    def __init__(self, puzzle: Puzzle) -> None:
+        self.packer = Schpacker(puzzle)
+        self.nwords = (self.packer.bits + 63) // 64
+        self.nslots = self.INITSLOTS
+        self.count = 0
+        self.table = self._newtable(self.nslots)
+        return
+
+    def _newtable(self, nslots: int) -> array | memoryview:
+        return array('Q', bytes(8 * self.nwords * nslots))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _slot(self, key: int) -> int:
+        return ((key * 0x9e3779b97f4a7c15) >> 32) & (self.nslots - 1)
+
+    def _probe(self, key: int) -> tuple[int, bool]:
+        '''
+        returns (slot #, if key found) of key (+ 1)
+        '''
+        nw = self.nwords
+        tb = self.table
+        mask = self.nslots - 1
+        sl = self._slot(key)
+        if nw == 1:
+            while (v := tb[sl]) != 0:
+                if v == key:
+                    return sl, True
+                sl = (sl + 1) & mask
+            return sl, False
+        while True:
+            v = 0
+            for w in range(nw):
+                v = (v << 64) | tb[sl * nw + w]
+            if v == 0:
+                return sl, False
+            if v == key:
+                return sl, True
+            sl = (sl + 1) & mask
+
+    def _put(self, sl: int, key: int) -> None:
+        nw = self.nwords
+        for w in range(nw - 1, -1, -1):
+            self.table[sl * nw + w] = key & 0xffffffffffffffff
+            key >>= 64
+        return
+
+    def _grow(self) -> None:
+        oldtable = self.table
+        nw = self.nwords
+        self.nslots <<= 1
+        self.table = self._newtable(self.nslots)
+        for sl in range(len(oldtable) // nw):
+            v = 0
+            for w in range(nw):
+                v = (v << 64) | oldtable[sl * nw + w]
+            if v != 0:
+                self._put(self._probe(v)[0], v)
+        return
+
+    def __contains__(self, schash: Schash) -> bool:
+        return self._probe(self.packer.pack(schash) + 1)[1]
+
+    def add(self, schash: Schash) -> None:
+        key = self.packer.pack(schash) + 1
+        sl, isfound = self._probe(key)
+        if isfound:
+            return
+        self._put(sl, key)
+        self.count += 1
+        if self.nslots < self.count * 2:  # load factor <= 0.5
+            self._grow()
+        return
+
+    def update(self, schashes: Iterable[Schash]) -> None:
+        for schash in schashes:
+            self.add(schash)
+        return
+
+    def __ior__(self, schashes: Iterable[Schash]) -> 'Arraymemo':
+        self.update(schashes)
+        return self
+
+    def __iter__(self) -> Iterator[Schash]:
+        nw = self.nwords
+        tb = self.table
+        for sl in range(self.nslots):
+            v = 0
+            for w in range(nw):
+                v = (v << 64) | tb[sl * nw + w]
+            if v != 0:
+                yield self.packer.unpack(v - 1)
+        return
+
+    def nbytes(self) -> int:
+        return self.table.itemsize * len(self.table)
+
+
+class Shmmemo(Arraymemo):
+    '''
+    Arraymemo on a shared memory block (a new block on each grow).
+    the owner (parent) adds, & the workers probe the same block: a pickled
+    Shmmemo is only the name of the block, attached (read only, no lock)
+    when unpickled.  the owner must not add while the workers probe.
+    only the owner process removes the block (not the forked copies).
+    '''
+    shm: Optional[shared_memory.SharedMemory]  # (None: closed)
+    table: memoryview
+
+    def _newtable(self, nslots: int) -> memoryview:
+        self.ownerpid = os.getpid()
+        self.shm = shared_memory.SharedMemory(create = True,
+                                              size = 8 * self.nwords * nslots)
+        # (a new block is filled with 0)
+        return self._view(nslots)
+
+    def _view(self, nslots: int) -> memoryview:
+        '''
+        the table of nslots on the attached block
+        '''
+        if self.shm is None or self.shm.buf is None:
+            raise ValueError('Shmmemo: block is closed')
+        return self.shm.buf[:8 * self.nwords * nslots].cast('Q')
+
+    def _grow(self) -> None:
+        oldshm, oldtable = self.shm, self.table
+        super()._grow()
+        if oldshm is not None:
+            self._free(oldshm, oldtable)
+        return
+
+    def _free(self, shm: shared_memory.SharedMemory,
+              table: memoryview) -> None:
+        table.release()
+        shm.close()
+        if self.ownerpid == os.getpid():
+            shm.unlink()
+        return
+
+    def close(self) -> None:
+        '''
+        detach (& remove if owner) the block
+        '''
+        if self.shm is not None:
+            self._free(self.shm, self.table)
+            self.shm = None
+        return
+
+    def __del__(self) -> None:
+        self.close()
+        return
+
+    def __getstate__(self) -> dict:
+        if self.shm is None:
+            raise ValueError('Shmmemo: block is closed')
+        return {'packer': self.packer, 'nwords': self.nwords,
+                'nslots': self.nslots, 'count': self.count,
+                'name': self.shm.name}
+
+    def __setstate__(self, state: dict) -> None:
+        self.packer = state['packer']
+        self.nwords = state['nwords']
+        self.nslots = state['nslots']
+        self.count = state['count']
+        self.ownerpid = -1
+        self.shm = shared_memory.SharedMemory(name = state['name'])
+        self.table = self._view(self.nslots)
+        return
+
+
+#------------------------------------------------------------------------
+# fixed size transposition table (for IDA*)
+#
+class Transtable:
+    '''
+    2-way set associative table of
+    (packed key + 1, ITERATION << 32 | G << 16 | PRIO) in array('Q')
+    (nwords + 1 words per entry, key 0: empty, PRIO: RLC tie-break).
+    the size is fixed: on a full bucket, the entry of an older iteration,
+    or the deeper (larger G) one is replaced (depth preferred: boards near
+    the init cut larger subtrees).
+    '''
+    def __init__(self, puzzle: Puzzle, nentries: int) -> None:
+        self.packer = Schpacker(puzzle)
+        self.nwords = (self.packer.bits + 63) // 64
+        self.esize = self.nwords + 1
+        self.nbuckets = max(1, nentries // 2)
+        self.table = array('Q', bytes(8 * self.esize * 2 * self.nbuckets))
+        self.iteration = 0
+        self.nstored = 0    # (in this iteration)
+        self.nreplaced = 0  # (in this iteration)
+        return
+
+    def newiteration(self) -> None:
+        '''
+        forget all (entries of older iterations are taken as empty)
+        '''
+        self.iteration += 1
+        self.nstored = 0
+        self.nreplaced = 0
+        return
+
+    def visit(self, schash: Schash, g: int, prio: int) -> bool:
+        '''
+        False if schash is visited at (G, PRIO) <= (g, prio) in this
+        iteration, or at G < g in the older (the shorter path is also in
+        the larger bound), else store (schash, g, prio) and True
+        '''
+        nw = self.nwords
+        tb = self.table
+        key = self.packer.pack(schash) + 1
+        info = (self.iteration << 32) | (g << 16) | prio
+        bk = ((key * 0x9e3779b97f4a7c15) >> 32) % self.nbuckets
+        victim = -1
+        victiminfo = 0
+        for way in range(2):
+            e = (bk * 2 + way) * self.esize
+            v = 0
+            for w in range(nw):
+                v = (v << 64) | tb[e + w]
+            einfo = tb[e + nw]
+            if v == key:
+                if einfo >> 32 == self.iteration:
+                    if einfo & 0xffffffff <= info & 0xffffffff:
+                        return False
+                elif (einfo >> 16) & 0xffff < g:
+                    return False
+                else:
+                    self.nstored += 1
+                tb[e + nw] = info
+                return True
+            # replace: empty/older iteration, else the larger G
+            if v == 0 or einfo >> 32 != self.iteration:
+                if victim < 0 or victiminfo >> 32 == self.iteration:
+                    victim, victiminfo = e, 0
+            elif victim < 0 or \
+                 (victiminfo >> 32 == self.iteration and
+                  victiminfo & 0xffffffff < einfo & 0xffffffff):
+                victim, victiminfo = e, einfo
+        if victiminfo >> 32 == self.iteration:
+            self.nreplaced += 1
+        else:
+            self.nstored += 1
+        for w in range(nw - 1, -1, -1):
+            tb[victim + w] = key & 0xffffffffffffffff
+            key >>= 64
+        tb[victim + nw] = info
+        return True
+
+    def nbytes(self) -> int:
+        return self.table.itemsize * len(self.table)
+
+
+#------------------------------------------------------------------------
+# backend independent functions
+#
+class Memoview(Protocol):
+    '''
+    what the child functions need of a memo: lookup only
+    (Memo, or dict[Schash, Mcr] of the bidirectional search)
+    '''
+    def __contains__(self, schash: Schash, /) -> bool: ...
+
+
+class Memo(Protocol):
+    '''
+    what the search needs of a memo: set[Schash], Arraymemo, Shmmemo
+    '''
+    def __contains__(self, schash: Schash, /) -> bool: ...
+    def __len__(self) -> int: ...
+    def __iter__(self) -> Iterator[Schash]: ...
+    def add(self, schash: Schash, /) -> None: ...
+    def update(self, schashes: Iterable[Schash], /) -> None: ...
+
+
+def makememo(puzzle: Puzzle, memotype: str) -> Memo:
+    match memotype:
+        case 'array':
+            return Arraymemo(puzzle)
+        case 'shm':
+            return Shmmemo(puzzle)
+        case _:
+            return set()
+
+
+def memonbytes(memo: Memo) -> int:
+    '''
+    bytes used by memo (for set: table + int objects, estimated)
+    '''
+    if isinstance(memo, Arraymemo):
+        return memo.nbytes()
+    nbytes = sys.getsizeof(memo)
+    for schash in memo:
+        nbytes += len(memo) * sys.getsizeof(schash)
+        break
+    return nbytes
+
+
+def memostat(memo: Memo) -> str:
+    if len(memo) == 0:
+        return ''
+    return f'{memonbytes(memo) / len(memo):.1f} bytes/state'
@@ -0,0 +1,131 @@
+#
+# hakoparbench.py:
+#   benchmark of the paralell backends of hakoiri.py (optimal step search):
+#     serial:  hakochild_optsteps() & mergenextsearch() on the parent
+#     procs:   child processes (hakopool.Hakopool, -x N)
+#     threads: threads in the process (hakopool.Hakothreads, -w -x N)
+#   the same BFS from the init is run for N steps by each backend, and
+#   # candidates searched per second is compared.  run it on each
+#   interpreter to compare (e.g. python3.13 & python3.13t, free-threaded):
+#   with the GIL, threads run Python code one at a time.
+#
+# usage: python hakoparbench.py [-s N] [-x N] [-d N] [-r R] PUZZLENAME
+#
+import argparse
+import platform
+import sys
+import time
+from typing import Optional
+
+import hakocom as hi
+from hakocom import Komaid, Colist, Schash, Dirid, Move, Movehist, Rlc, \
+    Mcr, Puzzle, Options
+import readpuzzle as rx
+import hakoiri as hk
+import hakopool as hp
+
+
+def gilstate() -> str:
+    if not hasattr(sys, '_is_gil_enabled'):  # (before 3.13)
+        return 'GIL'
+    return 'GIL' if sys._is_gil_enabled() else 'free-threaded'
+
+
+def runbfs(puzzle: Puzzle, nsteps: int, chunksize: int,
+           pool: Optional[hp.Hakopool | hp.Hakothreads]) \
+        -> tuple[list[int], float]:
+    '''
+    BFS of nsteps (or until the goal) by pool (None: serial)
+    returns (# candidates of each step, seconds)
+    '''
+    t = time.perf_counter()
+    init = Colist(puzzle.initcolist)
+    inithash = hi.hashcolist(puzzle, init)
+    memoschash: set[Schash] = {inithash}
+    newmemo: set[Schash] = {inithash}
+    tosearch = [Mcr(Movehist((Move((Komaid(0), Dirid(0))), )), init,
+                    Rlc(1))]
+    ncands = []
+    for step in range(nsteps):
+        if len(tosearch) == 0:
+            break
+        ncands.append(len(tosearch))
+        if pool is None:
+            foundans, nextsearch = hk.hakochild_optsteps(puzzle, tosearch,
+                                                         memoschash)
+        else:
+            if isinstance(pool, hp.Hakothreads):
+                newmemo = memoschash
+            foundans = []
+            nextsearch = dict()
+            for fachild, nschild in pool.search(tosearch, chunksize,
+                                                newmemo):
+                foundans += fachild
+                nextsearch.update(nschild)
+        if 0 < len(foundans):
+            break
+        memoschash |= nextsearch.keys()
+        newmemo = set(nextsearch.keys())
+        tosearch = list(nextsearch.values())
+    return ncands, time.perf_counter() - t
+
+
+def makepool(puzzle: Puzzle, name: str, nworkers: int) \
+        -> Optional[hp.Hakopool | hp.Hakothreads]:
+    match name:
+        case 'procs':
+            return hp.Hakopool(puzzle, hk.hakochild_optsteps,
+                               hk.mergenextsearch, False, 'set', False,
+                               nworkers)
+        case 'threads':
+            return hp.Hakothreads(puzzle, hk.hakochild_optsteps,
+                                  hk.mergenextsearch, False, nworkers)
+        case _:  # 'serial'
+            return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description = 'benchmark of paralell backends of hakoiri.py')
+    parser.add_argument('PUZZLENAME')
+    parser.add_argument('-s', '--steps', metavar = 'N', type = int,
+                        default = 30,
+                        help = '# steps to search')
+    parser.add_argument('-x', '--maxnprocs', metavar = 'N', type = int,
+                        default = 4,
+                        help = '# child processes/threads')
+    parser.add_argument('-d', '--chunksize', metavar = 'N', type = int,
+                        default = 200,
+                        help = '# candidates in a chunk')
+    parser.add_argument('-r', '--repeat', metavar = 'R', type = int,
+                        default = 3,
+                        help = '# repeats (best time is taken)')
+    args = parser.parse_args()
+    opts = Options()
+    opts.filename = args.PUZZLENAME
+    puzzle = rx.readxml(opts)
+    print(f'{platform.python_implementation()} {platform.python_version()}' +
+          f' ({gilstate()}), {args.maxnprocs} procs/threads, ' +
+          f'chunk: {args.chunksize}')
+    nref = None
+    for name in ('serial', 'procs', 'threads'):
+        best = float('inf')
+        for rp in range(args.repeat):
+            # (a new pool on each run: the workers keep the memo)
+            pool = makepool(puzzle, name, args.maxnprocs)
+            ncands, dt = runbfs(puzzle, args.steps, args.chunksize, pool)
+            if pool is not None:
+                pool.close()
+            if dt < best:
+                best = dt
+        if nref is None:
+            nref = ncands
+        elif ncands != nref:
+            print(f'  {name}: # candidates differ from serial')
+        print(f'  {name}: {best:.3f} s, {sum(ncands) / best:.0f} cand./s' +
+              f' ({len(ncands)} steps, {sum(ncands)} cand.)')
+    return
+
+
+if __name__ == '__main__':
+    main()
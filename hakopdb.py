@@ -0,0 +1,343 @@
+#
+# hakopdb.py:
+#   pattern databases (PDB) of lower bounds of # steps for the best first
+#   searches (-a/-i) of hakoiri.py
+#   a pattern keeps the goal komas & some other komas only (others are
+#   removed from the board), and # steps to the goal of every position of
+#   the pattern is found by retrograde BFS from the goals (all the moves are
+#   reversible, so it's the same BFS from all the goal positions).
+#   additive: the goal komas are in every pattern, but their moves are
+#   counted on the 1st pattern only, and other komas are in one pattern
+#   only, so the sum of the patterns never exceeds the real # steps.
+#   tables are saved as a file keyed by the board layout, komas & goal
+#   (not the init), read by memory mapping on the search.
+#
+# usage: python hakopdb.py [-o DIR] [-g KIDS] ... PUZZLENAME
+#
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+from collections import deque
+
+import hakocom as hi
+from hakocom import Coords, Komaid, Komacls, Colist, Dirid, Goaltype, \
+    Puzzle, Options
+import readpuzzle as rx
+
+PDBMAGIC = b'HKPDB1'
+# file: header (MAGIC, KEY, # tables), then tables of
+#   header (# komas, # entries), then komas of
+#     KOMAID, ISCOUNT (moves counted or not), # positions, POSITIONS,
+#   then entries (# steps, 8 bits: UNREACHED if not reached from the goal)
+FILEHEAD = struct.Struct('>6s20sB')
+TABLEHEAD = struct.Struct('>BQ')
+KOMAHEAD = struct.Struct('>BBB')
+MAXSTEPS = 254
+UNREACHED = 255
+# max # entries of a table
+MAXENTRIES = 1 << 28
+
+
+def pdbkey(puzzle: Puzzle) -> bytes:
+    '''
+    key of the board layout, komas & goal (of all the variants with
+    different inits)
+    '''
+    nkoma = puzzle.nkoma
+    desc = repr((puzzle.bsize, puzzle.basebmx,
+                 [puzzle.clssiz[puzzle.komacls[k]]
+                  for k in range(1, nkoma + 1)],
+                 [puzzle.clsshape[puzzle.komacls[k]]
+                  for k in range(1, nkoma + 1)],
+                 puzzle.komacls[1:nkoma + 1], puzzle.goaltype.name,
+                 sorted(puzzle.goal_koma)))
+    return hashlib.sha1(desc.encode()).digest()
+
+
+def pdbpath(puzzle: Puzzle, pdbdir: str) -> str:
+    return os.path.join(pdbdir, f'pdb-{pdbkey(puzzle).hex()[:16]}.bin')
+
+
+def positions(puzzle: Puzzle, kcls: Komacls) -> list[Coords]:
+    '''
+    all the coords the koma of kcls can be put on the empty board
+    '''
+    return [Coords(co) for co in range(256)
+            if puzzle.clsmask[kcls][co] != 0 and
+               puzzle.clsmask[kcls][co] & puzzle.basebmx == 0]
+
+
+class Pdb:
+    '''
+    a table: KOMAID of the pattern, moves counted or not, positions,
+    entries indexed by the positions of the komas in mixed radix
+    '''
+    def __init__(self, pattern: list[tuple[Komaid, bool]],
+                 poss: list[list[Coords]]) -> None:
+        self.kids = [kid for kid, iscount in pattern]
+        self.iscount = [iscount for kid, iscount in pattern]
+        self.poss = poss
+        # index of each coords in poss (-1 if not)
+        self.posidx = []
+        for pos in poss:
+            pidx = [-1] * 256
+            for pi, co in enumerate(pos):
+                pidx[co] = pi
+            self.posidx.append(pidx)
+        self.strides = [0] * len(poss)
+        stride = 1
+        for i in range(len(poss) - 1, -1, -1):
+            self.strides[i] = stride
+            stride *= len(poss[i])
+        self.nentries = stride
+        self.table: bytearray | memoryview = bytearray()
+        return
+
+    def lookup(self, colist: Colist) -> int:
+        idx = 0
+        for kid, pidx, stride in zip(self.kids, self.posidx, self.strides):
+            pi = pidx[colist[kid]]
+            if pi < 0:
+                return 0
+            idx += pi * stride
+        return self.table[idx]
+
+#........................................................................
+# build
+#
+    def build(self, puzzle: Puzzle) -> bytearray:
+        '''
+        0-1 BFS from all the goal positions of the pattern
+        (moves of not counted komas cost 0), returns the table
+        '''
+        kids, poss, posidx, strides = \
+            self.kids, self.poss, self.posidx, self.strides
+        kclss = [puzzle.komacls[kid] for kid in kids]
+        table = bytearray([UNREACHED]) * self.nentries
+        queue: deque[int] = deque()
+        for idx in goalindexes(puzzle, self):
+            table[idx] = 0
+            queue.append(idx)
+        while 0 < len(queue):
+            idx = queue.popleft()
+            nsteps = table[idx]
+            cos = []
+            rest = idx
+            for i, stride in enumerate(strides):
+                pi, rest = divmod(rest, stride)
+                cos.append(poss[i][pi])
+            bmx: int = puzzle.basebmx
+            for i, co in enumerate(cos):
+                bmx |= puzzle.clsmask[kclss[i]][co]
+            for i, co in enumerate(cos):
+                kcls = kclss[i]
+                kbmx = hi.Bmatrix(bmx ^ puzzle.clsmask[kcls][co])
+                nnsteps = min(nsteps + self.iscount[i], MAXSTEPS)
+                for dn in range(4):
+                    if hi.movecollidep(puzzle, kcls, Dirid(dn), co, kbmx):
+                        continue
+                    nidx = idx + (posidx[i][co + hi.dirvec[dn]] -
+                                  posidx[i][co]) * strides[i]
+                    if nnsteps < table[nidx]:
+                        table[nidx] = nnsteps
+                        if self.iscount[i]:
+                            queue.append(nidx)
+                        else:
+                            queue.appendleft(nidx)
+        self.table = table
+        return table
+
+
+def goalindexes(puzzle: Puzzle, pdb: Pdb) -> list[int]:
+    '''
+    indexes of all the positions of the pattern (komas not overlapped)
+    where the komas of the pattern are on the goal
+    '''
+    kids = pdb.kids
+    kclss = [puzzle.komacls[kid] for kid in kids]
+    # coords each koma can take on the goal (None: any)
+    allowed: list[set[Coords] | None] = [None] * len(kids)
+    if puzzle.goaltype != Goaltype.BYCLS:
+        # BYID: each goal koma is unique in its class,
+        # BYCLSHASH: the goal coords of all the komas of the class
+        for i, kcls in enumerate(kclss):
+            gcos = {gco for gkid, gco in puzzle.goal_koma
+                    if puzzle.komacls[gkid] == kcls}
+            if 0 < len(gcos):
+                allowed[i] = gcos
+
+    def isgoal(cos: list[Coords]) -> bool:
+        if puzzle.goaltype != Goaltype.BYCLS:
+            return True
+        # BYCLS: some koma of the class (all in the pattern) on each goal
+        for gkid, gco in puzzle.goal_koma:
+            if not any(co == gco and kclss[i] == puzzle.komacls[gkid]
+                       for i, co in enumerate(cos)):
+                return False
+        return True
+
+    goals: list[int] = []
+
+    def put(i: int, idx: int, bmx: int, cos: list[Coords]) -> None:
+        if i == len(kids):
+            if isgoal(cos):
+                goals.append(idx)
+            return
+        for pi, co in enumerate(pdb.poss[i]):
+            if bmx & puzzle.clsmask[kclss[i]][co] != 0:
+                continue
+            alco = allowed[i]
+            if alco is not None and not co in alco:
+                continue
+            cos.append(co)
+            put(i + 1, idx + pi * pdb.strides[i],
+                bmx | puzzle.clsmask[kclss[i]][co], cos)
+            cos.pop()
+        return
+
+    put(0, 0, puzzle.basebmx, [])
+    return goals
+
+
+def patterns(puzzle: Puzzle, groups: list[list[Komaid]]) \
+        -> list[list[tuple[Komaid, bool]]]:
+    '''
+    (KOMAID, ISCOUNT) of each pattern: the goal komas & a group
+    (goal komas are counted on the 1st pattern only)
+    '''
+    if puzzle.goaltype == Goaltype.BYCLSHASH:
+        goalkids: list[Komaid] = []  # all the komas have goals
+    elif puzzle.goaltype == Goaltype.BYCLS:
+        gclss = {puzzle.komacls[kid] for kid, gco in puzzle.goal_koma}
+        goalkids = [Komaid(k) for k in range(1, puzzle.nkoma + 1)
+                    if puzzle.komacls[k] in gclss]
+    else:
+        goalkids = [kid for kid, gco in puzzle.goal_koma]
+    if len(groups) == 0:
+        if len(goalkids) == 0:
+            hi.errorstop('specify the groups (-g) for the goal of all komas')
+        groups = [[]]
+    used = set(goalkids)
+    pats = []
+    for gn, group in enumerate(groups):
+        for kid in group:
+            if not 1 <= kid <= puzzle.nkoma:
+                hi.errorstop(f'no koma #{kid}')
+            if kid in used:
+                hi.errorstop(f'koma #{kid} in 2 or more groups (or a goal)')
+            used.add(kid)
+        pats.append([(kid, gn == 0) for kid in goalkids] +
+                    [(kid, True) for kid in group])
+    return pats
+
+#........................................................................
+# file
+#
+def savepdbs(puzzle: Puzzle, pdbdir: str, pdbs: list[Pdb]) -> str:
+    '''
+    write the tables (to tmp, then renamed), returns the path
+    '''
+    os.makedirs(pdbdir, exist_ok = True)
+    path = pdbpath(puzzle, pdbdir)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(FILEHEAD.pack(PDBMAGIC, pdbkey(puzzle), len(pdbs)))
+        for pdb in pdbs:
+            f.write(TABLEHEAD.pack(len(pdb.kids), pdb.nentries))
+            for kid, iscount, pos in zip(pdb.kids, pdb.iscount, pdb.poss):
+                f.write(KOMAHEAD.pack(kid, iscount, len(pos)))
+                f.write(bytes(pos))
+            f.write(pdb.table)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+class Pdbset:
+    '''
+    tables of the puzzle read from pdbdir (mapped from the file):
+    h(colist) = sum of the tables
+    '''
+    def __init__(self, puzzle: Puzzle, pdbdir: str) -> None:
+        path = pdbpath(puzzle, pdbdir)
+        try:
+            with open(path, 'rb') as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        except FileNotFoundError:
+            hi.errorstop(f'no pattern database for {puzzle.name} ' +
+                         f'in {pdbdir} (make it by hakopdb.py)')
+        magic, key, ntables = FILEHEAD.unpack_from(self.mm)
+        if magic != PDBMAGIC or key != pdbkey(puzzle):
+            hi.errorstop(f'{path}: not a pattern database of {puzzle.name}')
+        self.pdbs: list[Pdb] = []
+        ofs = FILEHEAD.size
+        for tn in range(ntables):
+            nkomas, nentries = TABLEHEAD.unpack_from(self.mm, ofs)
+            ofs += TABLEHEAD.size
+            pattern = []
+            poss = []
+            for kn in range(nkomas):
+                kid, iscount, npos = KOMAHEAD.unpack_from(self.mm, ofs)
+                ofs += KOMAHEAD.size
+                pattern.append((Komaid(kid), bool(iscount)))
+                poss.append([Coords(co) for co in self.mm[ofs:ofs + npos]])
+                ofs += npos
+            pdb = Pdb(pattern, poss)
+            pdb.table = memoryview(self.mm)[ofs:ofs + nentries]
+            ofs += nentries
+            self.pdbs.append(pdb)
+        return
+
+    def __call__(self, colist: Colist) -> int:
+        h = 0
+        for pdb in self.pdbs:
+            h += pdb.lookup(colist)
+        return h
+
+    def describe(self) -> str:
+        return ', '.join(f'{len(pdb.kids)} komas/{pdb.nentries} entries'
+                         for pdb in self.pdbs)
+
+
+#------------------------------------------------------------------------
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description = 'pattern database builder for hakoiri.py (-a/-i -b)')
+    parser.add_argument('PUZZLENAME')
+    parser.add_argument('-o', '--outdir', metavar = 'DIR', default = 'pdb',
+                        help = 'directory to write the database')
+    parser.add_argument('-g', '--group', metavar = 'KIDS', action = 'append',
+                        default = [],
+                        help = 'komas (# in XML order, comma separated) ' +
+                               'of a pattern with the goal komas')
+    args = parser.parse_args()
+    opts = Options()
+    opts.filename = args.PUZZLENAME
+    puzzle = rx.readxml(opts)
+    groups = []
+    for group in args.group:
+        try:
+            groups.append([Komaid(int(k)) for k in group.split(',')])
+        except ValueError:
+            hi.errorstop(f'bad group: {group}')
+    pdbs = []
+    for pattern in patterns(puzzle, groups):
+        poss = [positions(puzzle, puzzle.komacls[kid]) for kid, ic in pattern]
+        pdb = Pdb(pattern, poss)
+        names = ' '.join(puzzle.komanam[kid] + ('' if ic else '(0)')
+                         for kid, ic in pattern)
+        if MAXENTRIES < pdb.nentries:
+            hi.errorstop(f'pattern {names}: too many entries ' +
+                         f'({pdb.nentries}), make the group smaller')
+        table = pdb.build(puzzle)
+        nreached = pdb.nentries - table.count(UNREACHED)
+        maxsteps = max(table.translate(bytes(range(UNREACHED)) + b'\0'))
+        print(f'pattern {names}: {pdb.nentries} entries, ' +
+              f'{nreached} reached, max {maxsteps} steps')
+        pdbs.append(pdb)
+    print(f'written: {savepdbs(puzzle, args.outdir, pdbs)}')
+    return
+
+
+if __name__ == '__main__':
+    main()
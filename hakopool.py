@@ -0,0 +1,681 @@
+#
+# hakopool.py:
+#   persistent worker pool for hakoiri.py
+#   workers live for the whole search and keep their own copy of memoschash,
+#   updated on each step/RLC with the new hashes only.
+#   (-m shm: no copy, the workers probe the memo of the parent on the shared
+#   memory, handed as the name of the block on each step/RLC)
+#   candidates of a step/RLC are put in small chunks to a queue shared by
+#   the workers, and each worker takes the next chunk when it's done, so
+#   the workers done early take more chunks (no waiting for the slowest
+#   slice).
+#   chunks & results are handed as packed bytes of fixed size records
+#   (Mcrcodec), not as pickled Mcr objects.
+#   the results are merged by the workers, partitioned by hash: worker i
+#   merges the boards where schash % nworkers == i (from all the workers),
+#   and the parent only joins the disjoint parts.
+#   once a goal is found, the workers search only the candidates that may
+#   give a better answer (hi.canimprove()), and no more merge.
+#   Hakothreads: the same by threads in the process (-w), sharing the memo
+#   & candidates without copy nor pickling (for free-threaded Python).
+#
+import multiprocessing
+import multiprocessing.connection
+import pickle
+import queue
+import struct
+import sys
+import threading
+import time
+from array import array
+from typing import Callable, Iterator, Optional, cast
+
+import hakocom as hi
+from hakocom import Komaid, Colist, Schash, Dirid, \
+    Move, Movehist, Rlc, Bmatrix, Mcr, Puzzle
+import hakomemo as hm
+
+Childfunc = Callable[[Puzzle, list[Mcr], hm.Memoview],
+                     tuple[list[Mcr], dict[Schash, Mcr]]]
+Mergefunc = Callable[[Puzzle, bool, dict[Schash, Mcr], dict[Schash, Mcr]],
+                     None]
+# shared best hi.ansmetric() of the answers: no answer yet
+NOANS = 1 << 62
+# seconds to wait for a part from the others (then see if a goal is found)
+POLLWAIT = 0.05
+
+
+#------------------------------------------------------------------------
+# packed candidates & results
+#
+class Mcrcodec:
+    '''
+    list[Mcr] <-> bytes, to hand chunks to the workers & results back:
+      chunk: NCANDS, BASE (# of the 1st candidate in the step), then
+        records of
+        RLC, NSTEPS (before the last move), LASTMOVE (KOMAID << 2 | DIRID),
+        COLIST (0..nkoma), BMX (Bmatrix, 0: not made)
+      result: NFOUND, NNEXT, NTAILS, then records (found, then next) of
+        SCHASH (Sclist bytes), RLC, NBASE, PARENT (# in the step),
+        HEADMOVE (the parent's last move), NTAIL (# moves after it),
+        COLIST, BMX
+        and the moves after the parent's (array('H'), KOMAID << 2 | DIRID)
+    the worker searches Mcr of the last move only (histbase: # in the
+    step, as Histstore), the parent puts the moves before it back.
+    '''
+    def __init__(self, puzzle: Puzzle) -> None:
+        nk = puzzle.nkoma
+        self.nkoma = nk
+        self.nbmx = (puzzle.basebmx.bit_length() + 7) // 8
+        self.head = struct.Struct('<III')
+        self.crec = struct.Struct(f'<IIH{nk + 1}s{self.nbmx}s')
+        self.rrec = struct.Struct(f'<{nk}sIIIHH{nk + 1}s{self.nbmx}s')
+        # Move of (KOMAID << 2 | DIRID)
+        self.moves = [Move((Komaid(m >> 2), Dirid(m & 3)))
+                      for m in range((nk + 1) << 2)]
+        return
+
+    def packchunk(self, chunk: list[Mcr], base: int) -> bytes:
+        pack = self.crec.pack
+        nbmx = self.nbmx
+        recs = [self.head.pack(len(chunk), base, 0)]
+        for mcr in chunk:
+            kid, dirid = mcr.movehist[-1]
+            recs.append(pack(mcr.rlc, mcr.nbase + len(mcr.movehist) - 1,
+                             kid << 2 | dirid, bytes(mcr.colist),
+                             mcr.bmx.to_bytes(nbmx, 'little')))
+        return b''.join(recs)
+
+    def unpackchunk(self, buf: bytes) -> list[Mcr]:
+        moves = self.moves
+        ncands, base = self.head.unpack_from(buf)[:2]
+        view = memoryview(buf)[self.head.size:]
+        return [Mcr(Movehist((moves[m], )), Colist(tuple(cob)), Rlc(rlc),
+                    base + pn, nsteps,
+                    Bmatrix(int.from_bytes(bmb, 'little')))
+                for pn, (rlc, nsteps, m, cob, bmb) in
+                enumerate(self.crec.iter_unpack(
+                    view[:ncands * self.crec.size]))]
+
+    def packresult(self, foundans: list[Mcr],
+                   nextsearch: dict[Schash, Mcr]) -> bytes:
+        '''
+        (Mcr of the worker: movehist from the parent's last move)
+        '''
+        pack = self.rrec.pack
+        nk = self.nkoma
+        nbmx = self.nbmx
+        noschash = bytes(nk)
+        recs = []
+        tails = array('H')
+        for schash, mcr in [(None, mcr) for mcr in foundans] + \
+                           list(nextsearch.items()):
+            hkid, hdirid = mcr.movehist[0]
+            tail = mcr.movehist[1:]
+            recs.append(pack(noschash if schash is None else
+                             schash.to_bytes(nk, 'big'),
+                             mcr.rlc, mcr.nbase, mcr.histbase,
+                             hkid << 2 | hdirid, len(tail),
+                             bytes(mcr.colist),
+                             mcr.bmx.to_bytes(nbmx, 'little')))
+            tails.extend([kid << 2 | dirid for kid, dirid in tail])
+        return self.head.pack(len(foundans), len(nextsearch), len(tails)) + \
+            b''.join(recs) + tails.tobytes()
+
+    def unpackresult(self, buf: bytes,
+                     tosearch: Optional[list[Mcr]] = None) \
+            -> tuple[list[Mcr], dict[Schash, Mcr]]:
+        '''
+        with tosearch (on the parent): the moves before the tails are taken
+        from the parent in tosearch.  without: Mcr of the worker as packed.
+        '''
+        moves = self.moves
+        frombytes = int.from_bytes
+        nfound, nnext, ntails = self.head.unpack_from(buf)
+        view = memoryview(buf)[self.head.size:]
+        recend = (nfound + nnext) * self.rrec.size
+        tails = view[recend:recend + 2 * ntails].cast('H')
+        foundans: list[Mcr] = []
+        nextsearch: dict[Schash, Mcr] = dict()
+        tn = 0
+        for rn, (schb, rlc, nbase, pn, hmove, ntail, cob, bmb) in \
+                enumerate(self.rrec.iter_unpack(view[:recend])):
+            tail = tuple(map(moves.__getitem__, tails[tn:tn + ntail]))
+            tn += ntail
+            if tosearch is None:
+                mcr = Mcr(Movehist((moves[hmove], ) + tail),
+                          Colist(tuple(cob)), Rlc(rlc), pn, nbase,
+                          Bmatrix(frombytes(bmb, 'little')))
+            else:
+                parent = tosearch[pn]
+                mcr = Mcr(Movehist(parent.movehist + tail),
+                          Colist(tuple(cob)), Rlc(rlc), parent.histbase,
+                          parent.nbase, Bmatrix(frombytes(bmb, 'little')))
+            if rn < nfound:
+                foundans.append(mcr)
+            else:
+                nextsearch[Schash(frombytes(schb, 'big'))] = mcr
+        tails.release()
+        view.release()
+        return foundans, nextsearch
+
+
+#------------------------------------------------------------------------
+# child side
+#
+def poolworker(puzzle: Puzzle, childfunc: Childfunc, mergefunc: Mergefunc,
+               isoptrlc: bool, memotype: str, islayered: bool, wid: int,
+               tasks: multiprocessing.Queue,
+               inboxes: list[multiprocessing.Queue], found, best,
+               conn: multiprocessing.connection.Connection) -> None:
+    '''
+    loop until 'quit':
+      ('level', ) + pickled new hashes (shm: the memo of the parent)
+        -> merge new hashes to own memo (shm: attach it as own memo),
+           take packed TOSEARCH from tasks until None, search it and merge
+           the results to the parts by hash,
+           hand the parts to their owner workers (inboxes), merge the parts
+           of mine, and send ('result', packed NEXTSEARCH) back,
+           then ('done', BUSY (seconds searching), MERGE (seconds merging))
+    on a goal: send ('result', packed FOUNDANS) at once, set found (Event)
+    & best (Value, the best hi.ansmetric()).  after found is set (by any
+    worker), only the candidates that can improve best are searched, and
+    the results are not merged nor sent (the search ends on this step/RLC).
+    (on layered search, memo is only the new hashes of the last 2 calls)
+    '''
+    nworkers = len(inboxes)
+    for inbox in inboxes:
+        # (parts left unread when a goal is found don't block the exit)
+        inbox.cancel_join_thread()
+    codec = Mcrcodec(puzzle)
+    isshm = memotype == 'shm'
+    memoschash = set() if isshm else hm.makememo(puzzle, memotype)
+    lastnew: set[Schash] = set()
+    while True:
+        cmd = conn.recv()
+        if cmd[0] == 'quit':
+            break
+        # cmd[0] == 'level'
+        newmemo = pickle.loads(conn.recv_bytes())
+        if isshm:
+            # (the parent's memo, already with the new hashes/layers)
+            if isinstance(memoschash, hm.Shmmemo):
+                memoschash.close()
+            memoschash = newmemo
+        elif islayered:
+            memoschash = hm.makememo(puzzle, memotype)
+            memoschash.update(lastnew)
+            lastnew = newmemo
+        if not isshm:
+            memoschash.update(newmemo)
+        del(newmemo)
+        busy = 0.0
+        merge = 0.0
+        parts: list[dict[Schash, Mcr]] = [dict() for wn in range(nworkers)]
+        while (task := tasks.get()) is not None:
+            t = time.perf_counter()
+            try:
+                tosearch = codec.unpackchunk(task)
+                del(task)
+                if found.is_set():
+                    tosearch = [mcr for mcr in tosearch
+                                if hi.canimprove(isoptrlc, mcr, best.value)]
+                fachild, nschild = childfunc(puzzle, tosearch, memoschash)
+                del(tosearch)
+                t2 = time.perf_counter()
+                busy += t2 - t
+                if 0 < len(fachild):
+                    with best.get_lock():
+                        best.value = min([best.value] +
+                                         [hi.ansmetric(isoptrlc, mcr)
+                                          for mcr in fachild])
+                    found.set()
+                    conn.send(('result', codec.packresult(fachild, {})))
+                if found.is_set():
+                    continue
+                routed: list[dict[Schash, Mcr]] = \
+                    [dict() for wn in range(nworkers)]
+                for schash, mcr in nschild.items():
+                    routed[schash % nworkers][schash] = mcr
+                del(nschild)
+                for wn in range(nworkers):
+                    mergefunc(puzzle, isoptrlc, parts[wn], routed[wn])
+                del(routed)
+                merge += time.perf_counter() - t2
+            except Exception as e:
+                conn.send(e)
+        t = time.perf_counter()
+        try:
+            nextsearch = mergeparts(puzzle, mergefunc, isoptrlc, wid, parts,
+                                    inboxes, found, codec)
+            del(parts)
+            if nextsearch is not None:
+                conn.send(('result', codec.packresult([], nextsearch)))
+            del(nextsearch)
+        except Exception as e:
+            conn.send(e)
+            continue
+        merge += time.perf_counter() - t
+        conn.send(('done', busy, merge))
+    if isinstance(memoschash, hm.Shmmemo):
+        memoschash.close()
+    conn.close()
+    return
+
+
+def mergeparts(puzzle: Puzzle, mergefunc: Mergefunc, isoptrlc: bool,
+               wid: int, parts: list[dict[Schash, Mcr]],
+               inboxes: list[multiprocessing.Queue], found,
+               codec: Mcrcodec) -> Optional[dict[Schash, Mcr]]:
+    '''
+    hand parts to their owners, merge the parts of wid from the others.
+    None if a goal is found (before or while waiting).
+    '''
+    if found.is_set():
+        return None
+    for wn in range(len(inboxes)):
+        if wn != wid:
+            inboxes[wn].put(codec.packresult([], parts[wn]))
+    nextsearch = parts[wid]
+    for wn in range(len(inboxes) - 1):
+        while True:
+            try:
+                buf = inboxes[wid].get(timeout = POLLWAIT)
+                break
+            except queue.Empty:
+                if found.is_set():
+                    return None
+        mergefunc(puzzle, isoptrlc, nextsearch, codec.unpackresult(buf)[1])
+        del(buf)
+    return nextsearch
+
+
+#------------------------------------------------------------------------
+# parent side
+#
+def closeworkers(conns: list[multiprocessing.connection.Connection],
+                 procs: list[multiprocessing.Process]) -> None:
+    for conn in conns:
+        try:
+            conn.send(('quit', ))
+        except (BrokenPipeError, OSError):
+            pass
+        conn.close()
+    for proc in procs:
+        proc.join(timeout = 1)
+        if proc.is_alive():
+            proc.terminate()
+    conns.clear()
+    procs.clear()
+    return
+
+
+class Hakopool:
+    '''
+    nprocs workers forked once, reused on every step/RLC
+    '''
+    def __init__(self, puzzle: Puzzle, childfunc: Childfunc,
+                 mergefunc: Mergefunc, isoptrlc: bool, memotype: str,
+                 islayered: bool, nprocs: int) -> None:
+        self.conns: list[multiprocessing.connection.Connection] = []
+        self.procs: list[multiprocessing.Process] = []
+        # chunks of candidates (None: end of the step), taken by workers
+        self.tasks: multiprocessing.Queue = multiprocessing.Queue()
+        # parts of the results handed to the owner worker
+        inboxes: list[multiprocessing.Queue] = \
+            [multiprocessing.Queue() for pn in range(nprocs)]
+        # a goal is found on this call, & the best hi.ansmetric() of them
+        self.found = multiprocessing.Event()
+        self.best = multiprocessing.Value('q', NOANS)
+        for pn in range(nprocs):
+            pconn, cconn = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target = poolworker,
+                                           args = (puzzle, childfunc,
+                                                   mergefunc, isoptrlc,
+                                                   memotype, islayered, pn,
+                                                   self.tasks, inboxes,
+                                                   self.found, self.best,
+                                                   cconn),
+                                           daemon = True)
+            proc.start()
+            cconn.close()
+            self.conns.append(pconn)
+            self.procs.append(proc)
+        self.codec = Mcrcodec(puzzle)
+        self.idle: list[float] = []
+        self.busy: list[float] = []
+        self.merge: list[float] = []
+        return
+
+    def search(self, tosearch: list[Mcr], chunksize: int,
+               newmemo: hm.Memo) \
+            -> Iterator[tuple[list[Mcr], dict[Schash, Mcr]]]:
+        '''
+        hand newmemo (hashes added since the last call, or the Shmmemo
+        itself) to all workers, put tosearch in chunks of chunksize (& None
+        for each worker: end of the step) to the tasks.
+        yields (FOUNDANS, NEXTSEARCH) of each worker as completed:
+        NEXTSEARCH are merged & disjoint (by hash).
+        once FOUNDANS is yielded, NEXTSEARCH are not complete: the search
+        must end on this call, & the pool be closed (parts may be left).
+        self.busy/merge/idle: seconds each worker was searching/merging/
+        neither on this call.
+        '''
+        t = time.perf_counter()
+        self.found.clear()
+        self.best.value = NOANS
+        memobytes = pickle.dumps(newmemo, protocol = pickle.HIGHEST_PROTOCOL)
+        for conn in self.conns:
+            conn.send(('level', ))
+            conn.send_bytes(memobytes)
+        del(memobytes)
+        for st in range(0, len(tosearch), chunksize):
+            self.tasks.put(self.codec.packchunk(tosearch[st:st + chunksize],
+                                                st))
+        for conn in self.conns:
+            self.tasks.put(None)
+        self.busy = [0.0] * len(self.conns)
+        self.merge = [0.0] * len(self.conns)
+        waiting = self.conns[:]
+        while 0 < len(waiting):
+            # (wait() returns the objects given: Connections only here)
+            for conn in cast(list[multiprocessing.connection.Connection],
+                             multiprocessing.connection.wait(waiting)):
+                result = conn.recv()
+                if isinstance(result, Exception):
+                    print(f'error in task: {result}')
+                    sys.exit(11)
+                if result[0] == 'done':
+                    wn = self.conns.index(conn)
+                    self.busy[wn], self.merge[wn] = result[1:]
+                    waiting.remove(conn)
+                    continue
+                # (the moves before the tails are in tosearch)
+                yield self.codec.unpackresult(result[1], tosearch)
+        elapsed = time.perf_counter() - t
+        self.idle = [elapsed - b - m for b, m in zip(self.busy, self.merge)]
+        return
+
+    def close(self) -> None:
+        closeworkers(self.conns, self.procs)
+        return
+
+
+#------------------------------------------------------------------------
+# thread backend
+#
+class Hakothreads:
+    '''
+    nthreads threads started once, reused on every step/RLC, the same as
+    Hakopool: chunks from a shared queue, results merged by the threads
+    partitioned by hash, early stop on a goal.  the threads read memo &
+    candidates of the parent directly (no copy, no pickling); nobody
+    writes them while the threads search.
+    (with the GIL, one thread runs Python code at a time)
+    '''
+    QUIT = (-1, -1)
+
+    def __init__(self, puzzle: Puzzle, childfunc: Childfunc,
+                 mergefunc: Mergefunc, isoptrlc: bool, nthreads: int) \
+            -> None:
+        self.puzzle = puzzle
+        self.childfunc = childfunc
+        self.mergefunc = mergefunc
+        self.isoptrlc = isoptrlc
+        self.nthreads = nthreads
+        # (START, END) of the chunks in tosearch (None: end of the step)
+        self.tasks: queue.Queue = queue.Queue()
+        self.results: queue.Queue = queue.Queue()
+        # all the threads are done with the chunks (then merge)
+        self.barrier = threading.Barrier(nthreads)
+        self.found = threading.Event()
+        self.bestlock = threading.Lock()
+        self.best = NOANS
+        # set by search() for each step/RLC
+        self.tosearch: list[Mcr] = []
+        self.memoschash: hm.Memo = set()
+        # parts[i][j]: results of thread i of the boards owned by thread j
+        self.parts: list[list[dict[Schash, Mcr]]] = []
+        self.threads = [threading.Thread(target = self.threadworker,
+                                         args = (wid, ), daemon = True)
+                        for wid in range(nthreads)]
+        for th in self.threads:
+            th.start()
+        self.idle: list[float] = []
+        self.busy: list[float] = []
+        self.merge: list[float] = []
+        return
+
+    def threadworker(self, wid: int) -> None:
+        '''
+        take chunks until None, search them & merge the results to
+        parts[wid], wait for the others, merge parts[*][wid], and put
+        ('result', FOUNDANS, NEXTSEARCH) (FOUNDANS at once on a goal)
+        & ('done', wid, BUSY, MERGE) to results.  loop until QUIT.
+        '''
+        puzzle = self.puzzle
+        isoptrlc = self.isoptrlc
+        busy = 0.0
+        merge = 0.0
+        while (task := self.tasks.get()) != self.QUIT:
+            if task is not None:
+                t = time.perf_counter()
+                try:
+                    tosearch = self.tosearch[task[0]:task[1]]
+                    if self.found.is_set():
+                        tosearch = [mcr for mcr in tosearch
+                                    if hi.canimprove(isoptrlc, mcr,
+                                                     self.best)]
+                    fachild, nschild = self.childfunc(puzzle, tosearch,
+                                                      self.memoschash)
+                    del(tosearch)
+                    t2 = time.perf_counter()
+                    busy += t2 - t
+                    if 0 < len(fachild):
+                        with self.bestlock:
+                            self.best = min([self.best] +
+                                            [hi.ansmetric(isoptrlc, mcr)
+                                             for mcr in fachild])
+                        self.found.set()
+                        self.results.put(('result', fachild, dict()))
+                    if self.found.is_set():
+                        continue
+                    parts = self.parts[wid]
+                    routed: list[dict[Schash, Mcr]] = \
+                        [dict() for wn in range(self.nthreads)]
+                    for schash, mcr in nschild.items():
+                        routed[schash % self.nthreads][schash] = mcr
+                    del(nschild)
+                    for wn in range(self.nthreads):
+                        self.mergefunc(puzzle, isoptrlc, parts[wn],
+                                       routed[wn])
+                    del(routed)
+                    merge += time.perf_counter() - t2
+                except Exception as e:
+                    self.results.put(e)
+                continue
+            # None: end of the step
+            self.barrier.wait()
+            t = time.perf_counter()
+            try:
+                if not self.found.is_set():
+                    nextsearch = self.parts[wid][wid]
+                    for wn in range(self.nthreads):
+                        if wn != wid:
+                            self.mergefunc(puzzle, isoptrlc, nextsearch,
+                                           self.parts[wn][wid])
+                    self.results.put(('result', [], nextsearch))
+                    del(nextsearch)
+            except Exception as e:
+                self.results.put(e)
+            merge += time.perf_counter() - t
+            self.results.put(('done', wid, busy, merge))
+            busy = 0.0
+            merge = 0.0
+        return
+
+    def search(self, tosearch: list[Mcr], chunksize: int,
+               memoschash: hm.Memo) \
+            -> Iterator[tuple[list[Mcr], dict[Schash, Mcr]]]:
+        '''
+        == Hakopool.search(), but memoschash is the whole memo (not only
+        the new hashes), read by the threads as is.
+        '''
+        t = time.perf_counter()
+        self.found.clear()
+        self.best = NOANS
+        self.tosearch = tosearch
+        self.memoschash = memoschash
+        self.parts = [[dict() for j in range(self.nthreads)]
+                      for i in range(self.nthreads)]
+        for st in range(0, len(tosearch), chunksize):
+            self.tasks.put((st, st + chunksize))
+        for th in self.threads:
+            self.tasks.put(None)
+        self.busy = [0.0] * self.nthreads
+        self.merge = [0.0] * self.nthreads
+        ndone = 0
+        while ndone < self.nthreads:
+            result = self.results.get()
+            if isinstance(result, Exception):
+                print(f'error in task: {result}')
+                sys.exit(11)
+            if result[0] == 'done':
+                self.busy[result[1]], self.merge[result[1]] = result[2:]
+                ndone += 1
+                continue
+            yield result[1], result[2]
+        self.parts = []
+        self.tosearch = []
+        self.memoschash = set()
+        elapsed = time.perf_counter() - t
+        self.idle = [elapsed - b - m for b, m in zip(self.busy, self.merge)]
+        return
+
+    def close(self) -> None:
+        for th in self.threads:
+            self.tasks.put(self.QUIT)
+        for th in self.threads:
+            th.join()
+        self.threads.clear()
+        return
+
+#------------------------------------------------------------------------
+# hash-sharded search:
+#   worker i owns the boards where schash % nworkers == i,
+#   keeps its own part of memoschash and of the next candidates.
+#   generated boards are handed to their owner worker directly (inbox),
+#   not through the parent.
+#
+def shardworker(puzzle: Puzzle, childfunc: Childfunc, mergefunc: Mergefunc,
+                isoptrlc: bool, memotype: str, islayered: bool,
+                wid: int, inboxes: list[multiprocessing.Queue],
+                conn: multiprocessing.connection.Connection) -> None:
+    '''
+    loop until 'quit':
+      ('init', SCHASH, MCR): put MCR in the memo/candidates if I'm the owner
+      ('step', ): search own candidates, route the results to the owners,
+                  merge results routed to me
+                  -> send (FOUNDANS, #CANDIDATES, #MEMO) back
+    (on layered search, memo is only the own candidates of the last 2 steps)
+    '''
+    nworkers = len(inboxes)
+    memoschash = hm.makememo(puzzle, memotype)
+    lastlayer: set[Schash] = set()
+    tosearch: list[Mcr] = []
+    while True:
+        cmd = conn.recv()
+        if cmd[0] == 'quit':
+            break
+        if cmd[0] == 'init':
+            if cmd[1] % nworkers == wid:
+                memoschash.add(cmd[1])
+                lastlayer.add(cmd[1])
+                tosearch = [cmd[2]]
+            continue
+        # cmd[0] == 'step'
+        try:
+            foundans, nschild = childfunc(puzzle, tosearch, memoschash)
+            del(tosearch)
+            routed: list[dict[Schash, Mcr]] = \
+                [dict() for wn in range(nworkers)]
+            for schash, mcr in nschild.items():
+                routed[schash % nworkers][schash] = mcr
+            del(nschild)
+            for wn in range(nworkers):
+                if wn != wid:
+                    inboxes[wn].put(routed[wn])
+            nextsearch = routed[wid]
+            del(routed)
+            for wn in range(nworkers - 1):
+                nsother = inboxes[wid].get()
+                for schash in [h for h in nsother if h in memoschash]:
+                    del(nsother[schash])
+                mergefunc(puzzle, isoptrlc, nextsearch, nsother)
+                del(nsother)
+            if islayered:
+                memoschash = hm.makememo(puzzle, memotype)
+                memoschash.update(lastlayer)
+                lastlayer = set(nextsearch.keys())
+            memoschash.update(nextsearch.keys())
+            tosearch = list(nextsearch.values())
+            del(nextsearch)
+            conn.send((foundans, len(tosearch), len(memoschash)))
+        except Exception as e:
+            conn.send(e)
+    conn.close()
+    return
+
+
+class Hakoshard:
+    '''
+    nworkers workers, each owns a shard of the board space
+    '''
+    def __init__(self, puzzle: Puzzle, childfunc: Childfunc,
+                 mergefunc: Mergefunc, isoptrlc: bool, memotype: str,
+                 islayered: bool, nworkers: int) -> None:
+        self.conns: list[multiprocessing.connection.Connection] = []
+        self.procs: list[multiprocessing.Process] = []
+        inboxes: list[multiprocessing.Queue] = \
+            [multiprocessing.Queue() for wn in range(nworkers)]
+        for wn in range(nworkers):
+            pconn, cconn = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target = shardworker,
+                                           args = (puzzle, childfunc,
+                                                   mergefunc, isoptrlc,
+                                                   memotype, islayered, wn,
+                                                   inboxes, cconn),
+                                           daemon = True)
+            proc.start()
+            cconn.close()
+            self.conns.append(pconn)
+            self.procs.append(proc)
+        return
+
+    def init(self, schash: Schash, mcr: Mcr) -> None:
+        for conn in self.conns:
+            conn.send(('init', schash, mcr))
+        return
+
+    def step(self) -> tuple[list[Mcr], int, int]:
+        '''
+        returns (FOUNDANS, #CANDIDATES, #MEMO) summed up for all workers
+        '''
+        for conn in self.conns:
+            conn.send(('step', ))
+        foundans: list[Mcr] = []
+        ncand = 0
+        nmemo = 0
+        for conn in self.conns:
+            result = conn.recv()
+            if isinstance(result, Exception):
+                print(f'error in task: {result}')
+                sys.exit(11)
+            foundans += result[0]
+            ncand += result[1]
+            nmemo += result[2]
+        return foundans, ncand, nmemo
+
+    def close(self) -> None:
+        closeworkers(self.conns, self.procs)
+        return
@@ -0,0 +1,218 @@
+#
+# hakovec.py:
+#   numpy batched successor generation for hakoiri.py (optimal step search)
+#   a chunk of candidates is held as arrays, coords (N, nkoma) & board rows
+#   (N, board height), and collision, successor coords, hash & goal test are
+#   computed for all the candidates of the chunk at once.
+#   only the unique successors not in memo are made into Mcr.
+#
+try:
+    import numpy as np
+    ISNUMPY = True
+except ImportError:
+    ISNUMPY = False
+
+import hakocom as hi
+from hakocom import Coords, Komaid, Colist, Schash, Dirid, \
+    Move, Movehist, Rlc, Mcr, Goaltype, Puzzle
+from hakocom import cox, coy
+import hakomemo as hm
+
+# candidates in a chunk (successors are up to 4 x nkoma x CHUNKCANDS)
+CHUNKCANDS = 1 << 13
+# (dy, dx) of hi.dirvec
+DIRYX = [(-1, 0), (0, 1), (1, 0), (0, -1)]
+
+
+class Vecpuzzle:
+    '''
+    puzzle definitions as arrays (index of koma: kid - 1)
+    '''
+    def __init__(self, puzzle: Puzzle) -> None:
+        nkoma = puzzle.nkoma
+        self.nkoma = nkoma
+        self.bwidth = cox(puzzle.bsize)
+        self.baserows = np.array([hi.bmxrow(puzzle.basebmx, y)
+                                  for y in range(coy(puzzle.bsize))],
+                                 dtype = np.uint32)
+        kcls = puzzle.komacls[1:nkoma + 1]
+        # shape rows of each koma
+        self.shape = [[int(r) for r in puzzle.clsshape[kc]] for kc in kcls]
+        self.kwidth = np.array([cox(puzzle.clssiz[kc]) for kc in kcls],
+                               dtype = np.int32)
+        # koma indexes of each class, in the order of Sclist
+        self.clscols = []
+        for kc in range(1, len(puzzle.clssiz)):
+            cols = [k for k in range(nkoma) if kcls[k] == kc]
+            if 0 < len(cols):
+                self.clscols.append((puzzle.clsofs[kc], cols))
+        self.goaltype = puzzle.goaltype
+        self.goalrow = np.frombuffer(
+            puzzle.goal_schash.to_bytes(nkoma, 'big'), dtype = np.uint8)
+        self.goalkoma = [(kid - 1, gco,
+                          [k for k in range(nkoma)
+                           if kcls[k] == puzzle.komacls[kid]])
+                         for kid, gco in puzzle.goal_koma]
+        self.ismirrorident = puzzle.ismirrorident
+        return
+
+    def drawrows(self, rows, ar, ys, xs, k: int) -> None:
+        '''
+        reverse (draw/erase) koma k at (ys, xs) on rows (by pointer)
+        '''
+        for r, srow in enumerate(self.shape[k]):
+            rows[ar, ys + r] ^= np.left_shift(np.uint32(srow),
+                                              xs.astype(np.uint32))
+        return
+
+    def collide(self, rows, ar, ys, xs, k: int):
+        '''
+        bool array: koma k at (ys, xs) collides on rows
+        '''
+        acc = np.zeros(len(ar), dtype = np.uint32)
+        for r, srow in enumerate(self.shape[k]):
+            acc |= rows[ar, ys + r] & \
+                   np.left_shift(np.uint32(srow), xs.astype(np.uint32))
+        return acc != 0
+
+    def hashrows(self, cos):
+        '''
+        Sclist (class sorted coords, mirror considered) of each row of cos
+        as (M, nkoma) uint8: == hi.hashcolist() in big endian bytes
+        '''
+        sc = np.empty(cos.shape, dtype = np.uint8)
+        for st, cols in self.clscols:
+            sc[:, st:st + len(cols)] = np.sort(cos[:, cols], axis = 1)
+        if not self.ismirrorident:
+            return sc
+        mcos = (cos & 0xf0) | (self.bwidth - (cos & 0xf) - self.kwidth)
+        msc = np.empty(cos.shape, dtype = np.uint8)
+        for st, cols in self.clscols:
+            msc[:, st:st + len(cols)] = np.sort(mcos[:, cols], axis = 1)
+        # take the smaller in lexicographic (== big endian int) order
+        diff = sc != msc
+        first = np.argmax(diff, axis = 1)
+        ar = np.arange(len(sc))
+        usemirror = diff.any(axis = 1) & (msc[ar, first] < sc[ar, first])
+        sc[usemirror] = msc[usemirror]
+        return sc
+
+    def isgoal(self, cos, sc):
+        '''
+        bool array: == hi.isgoal() of each row
+        '''
+        match self.goaltype:
+            case Goaltype.BYCLSHASH:
+                return (sc == self.goalrow).all(axis = 1)
+            case Goaltype.BYID:
+                ok = np.ones(len(cos), dtype = bool)
+                for k, gco, cols in self.goalkoma:
+                    ok &= cos[:, k] == gco
+                return ok
+            case _:  # Goaltype.BYCLS
+                ok = np.ones(len(cos), dtype = bool)
+                for k, gco, cols in self.goalkoma:
+                    ok &= (cos[:, cols] == gco).any(axis = 1)
+                return ok
+
+
+def hakochild_vec(puzzle: Puzzle,
+                  tosearch: list[Mcr], memoschash: hm.Memoview
+                 ) -> tuple[list[Mcr], dict[Schash, Mcr]]:
+    '''
+    == hakochild_optsteps(), candidates in chunks of CHUNKCANDS
+    returns foundans, {SCHASH: (MOVES, COLIST, RLC), ...}
+    '''
+    vp = Vecpuzzle(puzzle)
+    nextsearch: dict[Schash, Mcr] = dict()
+    foundans: list[Mcr] = []
+    for st in range(0, len(tosearch), CHUNKCANDS):
+        childchunk(vp, tosearch[st:st + CHUNKCANDS], memoschash,
+                   nextsearch, foundans)
+    return foundans, nextsearch
+
+
+def childchunk(vp: Vecpuzzle, chunk: list[Mcr], memoschash: hm.Memoview,
+               nextsearch: dict[Schash, Mcr], foundans: list[Mcr]) -> None:
+    '''
+    successors of chunk into nextsearch/foundans (by pointer)
+    '''
+    nkoma = vp.nkoma
+    n = len(chunk)
+    ar = np.arange(n)
+    cos = np.array([mcr.colist[1:] for mcr in chunk], dtype = np.int32)
+    ys = cos >> 4
+    xs = cos & 0xf
+    lastkid = np.array([mcr.movehist[-1][0] for mcr in chunk],
+                       dtype = np.int32) - 1
+    lastdir = np.array([mcr.movehist[-1][1] for mcr in chunk],
+                       dtype = np.int32)
+    nsteps = np.array([mcr.nbase + len(mcr.movehist) for mcr in chunk],
+                      dtype = np.int32)
+    rlc = np.array([mcr.rlc for mcr in chunk], dtype = np.int32)
+    rows = np.tile(vp.baserows, (n, 1))
+    for k in range(nkoma):
+        vp.drawrows(rows, ar, ys[:, k], xs[:, k], k)
+# successors of all (candidate, koma, dir): parent #, koma, dir, coords...
+    parts = []
+    for k in range(nkoma):
+        vp.drawrows(rows, ar, ys[:, k], xs[:, k], k)  # erase koma
+        for dn, (dy, dx) in enumerate(DIRYX):
+            nys = ys[:, k] + dy
+            nxs = xs[:, k] + dx
+            ok = ~vp.collide(rows, ar, nys, nxs, k) & \
+                 ~((lastkid == k) & ((lastdir - dn) % 4 == 2))
+            idx = np.nonzero(ok)[0]
+            if len(idx) == 0:
+                continue
+            # can move kid further (not back): same as cancontigmove()
+            iscontig = np.zeros(len(idx), dtype = bool)
+            for dn2, (dy2, dx2) in enumerate(DIRYX):
+                if (dn - dn2) % 4 == 2:
+                    continue
+                iscontig |= ~vp.collide(rows, idx, nys[idx] + dy2,
+                                        nxs[idx] + dx2, k)
+            newcos = cos[idx].copy()
+            newcos[:, k] = (nys[idx] << 4) | nxs[idx]
+            newrlc = rlc[idx] + ((3 <= nsteps[idx] + 1) &
+                                 (lastkid[idx] != k))
+            parts.append((idx, k, dn, newcos, newrlc, iscontig))
+        vp.drawrows(rows, ar, ys[:, k], xs[:, k], k)  # recover koma
+    if len(parts) == 0:
+        return
+    parent = np.concatenate([p[0] for p in parts])
+    kids = np.concatenate([np.full(len(p[0]), p[1] + 1) for p in parts])
+    dirs = np.concatenate([np.full(len(p[0]), p[2]) for p in parts])
+    newcos = np.concatenate([p[3] for p in parts])
+    newrlc = np.concatenate([p[4] for p in parts])
+    iscontig = np.concatenate([p[5] for p in parts])
+    del(parts)
+    sc = vp.hashrows(newcos)
+
+    def makemcr(i: int) -> Mcr:
+        mcr = chunk[parent[i]]
+        return Mcr(Movehist(mcr.movehist +
+                            (Move((Komaid(int(kids[i])),
+                                   Dirid(int(dirs[i])))), )),
+                   Colist((Coords(0), ) + tuple(newcos[i].tolist())),
+                   Rlc(int(newrlc[i])), mcr.histbase, mcr.nbase)
+
+    isgoal = vp.isgoal(newcos, sc)
+    for i in np.nonzero(isgoal)[0]:
+        foundans.append(makemcr(int(i)))
+        print('@found')
+# unique boards: the best (lower rlc, then contigurous move) of the same hash
+    order = np.nonzero(~isgoal)[0]
+    order = order[np.lexsort((~iscontig[order], newrlc[order]))]
+    keys = np.ascontiguousarray(sc[order]).view(
+        np.dtype((np.void, nkoma))).ravel()
+    first = np.unique(keys, return_index = True)[1]
+    for i in order[first]:
+        newschash = Schash(int.from_bytes(sc[i].tobytes(), 'big'))
+        if newschash in memoschash:
+            continue
+        if not newschash in nextsearch or \
+           newrlc[i] < nextsearch[newschash].rlc or \
+           (newrlc[i] == nextsearch[newschash].rlc and iscontig[i]):
+            nextsearch[newschash] = makemcr(int(i))
+    return
@@ -239,6 +239,7 @@ def readxml(opts: Options) -> Puzzle:
     puzzle.komanamshort = [''] + \
         [knsdict[Komaid(i)] for i in range(1, puzzle.nkoma + 1)]
 
+    hi.compilepuzzle(puzzle)
 # check init & goal
     checkcolist(puzzle, Colist(tuple(initcol)))
     checkcolist(puzzle, Colist(tuple(gkomalist)))
@@ -265,15 +266,15 @@ def checkcolist(puzzle, colist: Colist) -> None:
                   f'{co2yx(kcoords)} exceeds board size ' +\
                   f'{co2yx(puzzle.bsize)}')
         if 1 < kid and \
-           hi.collidep(colist[kid], puzzle.clssiz[puzzle.komacls[kid]],
-                       puzzle.clsshape[puzzle.komacls[kid]], bmx):
+           hi.collidep(puzzle, puzzle.komacls[kid], colist[kid], bmx):
             hi.printnamematrix(puzzle, Colist(tuple(lastcol)),
                                file = sys.stderr)
             hi.errorstop(
                 f'koma {kid} ("{puzzle.komanam[kid]}") collides at ' +\
                 f'{co2yx(colist[kid])}')
         lastcol[kid] = kcoords
-        hi.drawerasebmx(puzzle, puzzle.komacls[kid], kcoords, bmx, mode = 1)
+        bmx = hi.drawerasebmx(puzzle, puzzle.komacls[kid], kcoords, bmx,
+                              mode = 1)
         # draw rect koma
     return
 
@@ -0,0 +1,140 @@
+#
+# test_hakoiri.py:
+#   regression of the search modes of hakoiri.py: each mode must find the
+#   same # steps & RLC as the default BFS (optimal steps, -t) or as the
+#   optimal RLC search (-r) on the small puzzles.
+#
+# usage: python -m pytest -q test_hakoiri.py
+#
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PUZZLES = ['debug', 'simplicity2']
+# (# steps, RLC) of the default search: (optimal steps, optimal RLC)
+BASELINE = {'debug': ((4, 4), (6, 3)),
+            'simplicity2': ((128, 68), (128, 68))}
+
+STEPMODES = [
+    [], ['-n'], ['-p', '-x', '2', '-d', '8'],
+    ['-H', '-x', '2', '-d', '8'],
+    ['-P'],
+    ['-m', 'array'],
+    ['-l'],
+    ['-a'],
+    ['-i'],
+    ['-m', 'shm'], ['-l', '-m', 'shm'],
+    ['-w', '-x', '2', '-d', '8'],
+    ['-B'],
+]
+RLCMODES = [
+    ['-r'], ['-r', '-n'], ['-r', '-p', '-x', '2', '-d', '8'],
+    ['-r', '-P'],
+    ['-r', '-l'],
+    ['-z'],
+]
+
+
+def solve(puzname: str, opts: list[str], cwd: str) -> tuple[int, int]:
+    '''
+    run hakoiri.py, returns (# steps, RLC) of the answer
+    '''
+    result = subprocess.run(
+        [sys.executable, os.path.join(HERE, 'hakoiri.py'),
+         os.path.join(HERE, 'puzzles', puzname + '.xml')] + opts,
+        capture_output = True, text = True, cwd = cwd, timeout = 600)
+    assert result.returncode == 0, result.stderr
+    steps = re.findall(r'^step (\d+), rectlin (\d+),', result.stdout,
+                       re.MULTILINE)
+    assert 0 < len(steps), result.stdout[-1000:]
+    return int(steps[-1][0]), int(steps[-1][1])
+
+
+@pytest.mark.parametrize('puzname', PUZZLES)
+@pytest.mark.parametrize('opts', STEPMODES, ids = ' '.join)
+def test_optsteps(puzname: str, opts: list[str], tmp_path) -> None:
+    assert solve(puzname, opts, str(tmp_path)) == BASELINE[puzname][0]
+
+
+@pytest.mark.parametrize('puzname', PUZZLES)
+@pytest.mark.parametrize('opts', RLCMODES, ids = ' '.join)
+def test_optrlc(puzname: str, opts: list[str], tmp_path) -> None:
+    assert solve(puzname, opts, str(tmp_path)) == BASELINE[puzname][1]
+
+
+@pytest.mark.parametrize('puzname', PUZZLES)
+@pytest.mark.parametrize('opts', [[], ['-l']], ids = ' '.join)
+def test_extmemory(puzname: str, opts: list[str], tmp_path) -> None:
+    assert solve(puzname, ['-e', str(tmp_path / 'ext')] + opts,
+                 str(tmp_path)) == BASELINE[puzname][0]
+
+
+@pytest.mark.parametrize('saveopts, resumeopts',
+                         [([], []), (['-P'], ['-P']), (['-P'], [])])
+def test_resume(saveopts: list[str], resumeopts: list[str],
+                tmp_path) -> None:
+    # (the checkpoint is saved when stopped by -s)
+    result = subprocess.run(
+        [sys.executable, os.path.join(HERE, 'hakoiri.py'),
+         os.path.join(HERE, 'puzzles', 'simplicity2.xml'),
+         '-k', '20', '-s', '60'] + saveopts,
+        capture_output = True, text = True, cwd = str(tmp_path),
+        timeout = 600)
+    assert '@stopped' in result.stdout, result.stderr
+    assert solve('simplicity2', ['-u'] + resumeopts, str(tmp_path)) == \
+        BASELINE['simplicity2'][0]
+
+
+@pytest.mark.parametrize('puzname', PUZZLES)
+def test_numpy(puzname: str, tmp_path) -> None:
+    pytest.importorskip('numpy')
+    assert solve(puzname, ['-y'], str(tmp_path)) == BASELINE[puzname][0]
+
+
+def test_astar_classgoals(tmp_path) -> None:
+    # (some goals of one class: the bound must be consistent)
+    assert solve('supersuperdries', ['-a'], str(tmp_path)) == (494, 388)
+
+
+@pytest.mark.parametrize('puzname', ['debug', 'supersuperdries'])
+def test_heuristic_consistent(puzname: str) -> None:
+    sys.path.insert(0, HERE)
+    import hakocom as hi
+    import hakoheur as hh
+    import hakoiri as hk
+    import readpuzzle as rx
+    opts = hi.Options()
+    opts.filename = os.path.join(HERE, 'puzzles', puzname + '.xml')
+    puzzle = rx.readxml(opts)
+    heur = hh.Heuristic(puzzle)
+    init = hi.Colist(puzzle.initcolist)
+    memoschash = {hi.hashcolist(puzzle, init)}
+    tosearch = [hi.Mcr(hi.Movehist((hi.Move((hi.Komaid(0), hi.Dirid(0))), )),
+                       init, hi.Rlc(1))]
+    for step in range(40):
+        for mcr in tosearch:
+            h = heur(mcr.colist)
+            foundans, nextsearch = hk.hakochild_optsteps(puzzle, [mcr],
+                                                         set())
+            for cmcr in foundans + list(nextsearch.values()):
+                assert abs(heur(cmcr.colist) - h) <= 1
+        foundans, nextsearch = hk.hakochild_optsteps(puzzle, tosearch,
+                                                     memoschash)
+        memoschash |= nextsearch.keys()
+        tosearch = list(nextsearch.values())
+
+
+def test_bidir_goalside(tmp_path) -> None:
+    # (the goal reached again from the goal side is not an answer)
+    result = subprocess.run(
+        [sys.executable, os.path.join(HERE, 'hakoiri.py'),
+         os.path.join(HERE, 'puzzles', 'century+50.xml'), '-B'],
+        capture_output = True, text = True, cwd = str(tmp_path),
+        timeout = 600)
+    assert result.returncode == 0, result.stderr
+    assert not '@found' in result.stdout
+    assert 'step 205, rectlin 148,' in result.stdout